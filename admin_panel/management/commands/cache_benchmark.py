@@ -0,0 +1,134 @@
+import multiprocessing
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'filebased': 'django.core.cache.backends.filebased.FileBasedCache',
+    'sqlite': 'core.cache_backends.SQLiteCache',
+}
+
+
+def _make_cache(name, location, keys):
+    return import_string(BACKENDS[name])(location, {
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': keys * 2},
+    })
+
+
+def _mixed_load(name, location, keys, ops, value, seed):
+    """Нагрузка одного процесса: 90% чтений, 10% записей и счетчик версий"""
+    cache = _make_cache(name, location, keys)
+    rng = random.Random(seed)
+    increments = 0
+    started = time.perf_counter()
+    for i in range(ops):
+        key = f'key-{rng.randrange(keys)}'
+        if i % 10:
+            cache.get(key)
+        else:
+            cache.set(key, value)
+            try:
+                cache.incr('version')
+                increments += 1
+            except ValueError:
+                pass
+    return time.perf_counter() - started, increments
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает скорость кэшей LocMemCache, FileBasedCache и SQLiteCache '
+        '(core.cache_backends): одиночные операции и смешанная нагрузка '
+        'из нескольких процессов. Кэши создаются во временном каталоге.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backends', default=','.join(BACKENDS),
+            help=f'Какие кэши сравнивать через запятую (из {", ".join(BACKENDS)})',
+        )
+        parser.add_argument(
+            '--ops', type=int, default=2000,
+            help='Сколько операций каждого вида выполнять',
+        )
+        parser.add_argument(
+            '--keys', type=int, default=500,
+            help='Сколько разных ключей использовать',
+        )
+        parser.add_argument(
+            '--value-size', type=int, default=2048,
+            help='Размер значения в байтах',
+        )
+        parser.add_argument(
+            '--processes', type=int, default=4,
+            help='Сколько процессов создают смешанную нагрузку',
+        )
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['backends'].split(',') if name.strip()]
+        unknown = set(names) - set(BACKENDS)
+        if unknown:
+            raise CommandError(f'Неизвестные кэши: {", ".join(sorted(unknown))}')
+
+        with tempfile.TemporaryDirectory() as directory:
+            for name in names:
+                location = str(Path(directory) / name)
+                if name == 'sqlite':
+                    location += '.sqlite3'
+                self._single(name, location, options)
+                self._parallel(name, location, options)
+
+    def _single(self, name, location, options):
+        keys, ops = options['keys'], options['ops']
+        cache = _make_cache(name, location, keys)
+        value = b'x' * options['value_size']
+        cache.set('version', 0, timeout=None)
+
+        operations = {
+            'set': lambda i: cache.set(f'key-{i % keys}', value),
+            'get': lambda i: cache.get(f'key-{i % keys}'),
+            'get (промах)': lambda i: cache.get(f'missing-{i}'),
+            'get_many(20)': lambda i: cache.get_many([f'key-{(i + j) % keys}' for j in range(20)]),
+            'incr': lambda i: cache.incr('version'),
+        }
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{name}: один процесс'))
+        for operation, run in operations.items():
+            started = time.perf_counter()
+            for i in range(ops):
+                run(i)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'  {operation:<14} {elapsed / ops * 1e6:9.1f} мкс/оп  {ops / elapsed:10.0f} оп/с'
+            )
+
+    def _parallel(self, name, location, options):
+        processes, ops = options['processes'], options['ops']
+        cache = _make_cache(name, location, options['keys'])
+        cache.set('version', 0, timeout=None)
+        value = b'x' * options['value_size']
+
+        context = multiprocessing.get_context('fork')
+        started = time.perf_counter()
+        with context.Pool(processes) as pool:
+            results = pool.starmap(_mixed_load, [
+                (name, location, options['keys'], ops, value, seed)
+                for seed in range(processes)
+            ])
+        elapsed = time.perf_counter() - started
+
+        # Счетчик должен вырасти на число всех incr() из всех процессов:
+        # у LocMemCache он свой в каждом процессе, у FileBasedCache incr
+        # не атомарен и часть увеличений теряется
+        expected = sum(increments for _, increments in results)
+        lost = expected - (cache.get('version') or 0)
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{name}: процессов - {processes}, 90% чтений'))
+        self.stdout.write(
+            f'  {processes * ops / elapsed:10.0f} оп/с всего, '
+            f'потеряно увеличений счетчика: {lost} из {expected}'
+        )
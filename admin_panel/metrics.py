@@ -0,0 +1,79 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from core.dates import day_start
+from orders.models import DailyProductSales, Order
+from orders.rollup import EXCLUDED_STATUSES
+from products.models import Product
+
+METRICS_CACHE_KEY = 'admin_panel:metrics'
+
+# Периоды сводной статистики: сколько дней назад начинается период
+PERIOD_DAYS = {
+    'today': 0,
+    'week': 7,
+    'month': 30,
+    'year': 365,
+}
+
+
+def period_start(period, now=None):
+    """Начало периода - полночь в текущем часовом поясе"""
+    return day_start(timezone.localdate(now) - timedelta(days=PERIOD_DAYS[period]))
+
+
+def compute_metrics():
+    """
+    Сводные показатели заказов за все периоды одним запросом.
+
+    Каждый период - это условная агрегация (Sum/Count с filter=Q(...))
+    по сохраненным итогам заказа, без соединения со строками заказов.
+    Отмененные заказы не учитываются - так же, как в сводке продаж
+    DailyProductSales, из которой строится таблица товаров.
+    """
+    sold = ~Q(status__in=EXCLUDED_STATUSES)
+    aggregates = {
+        'total_orders': Count('id', filter=sold),
+        'total_revenue': Sum('total_cost', filter=sold),
+    }
+    for period in PERIOD_DAYS:
+        in_period = sold & Q(created__gte=period_start(period))
+        aggregates[f'orders_{period}'] = Count('id', filter=in_period)
+        aggregates[f'revenue_{period}'] = Sum('total_cost', filter=in_period)
+        aggregates[f'order_items_{period}'] = Sum('items_count', filter=in_period)
+
+    metrics = {
+        name: value or 0
+        for name, value in Order.objects.aggregate(**aggregates).items()
+    }
+    # Суммы по DecimalField из агрегатов SQLite приходят без округления до копеек
+    for name in ['total_revenue', *(f'revenue_{period}' for period in PERIOD_DAYS)]:
+        metrics[name] = Decimal(metrics[name]).quantize(Decimal('0.01'))
+    metrics['total_products'] = Product.objects.count()
+    metrics['popular_products_data'] = list(
+        DailyProductSales.objects.values(
+            'product__id', 'product__name'
+        ).annotate(
+            total_ordered=Sum('quantity'),
+            total_revenue=Sum('revenue')
+        ).order_by('-total_ordered')[:10]
+    )
+    return metrics
+
+
+def get_metrics():
+    """Сводные показатели из кэша; пересчет не чаще раза в ADMIN_METRICS_CACHE_TTL секунд"""
+    metrics = cache.get(METRICS_CACHE_KEY)
+    if metrics is None:
+        metrics = compute_metrics()
+        cache.set(METRICS_CACHE_KEY, metrics, settings.ADMIN_METRICS_CACHE_TTL)
+    return metrics
+
+
+def invalidate_metrics():
+    cache.delete(METRICS_CACHE_KEY)
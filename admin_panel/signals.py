@@ -0,0 +1,19 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from orders.models import Order, OrderItem
+from products.models import Product
+from .metrics import invalidate_metrics
+
+
+# Сброс после фиксации транзакции: иначе параллельный запрос может
+# пересчитать показатели до коммита и снова положить в кэш старые данные
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def metrics_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_metrics)
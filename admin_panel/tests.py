@@ -1,3 +1,208 @@
+import csv
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Sum
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from admin_panel.metrics import PERIOD_DAYS, get_metrics, period_start
+from core.testing import QueryPlanMixin, analyze, make_orders, make_products, sqlite_only
+from orders.models import Order, OrderItem
+
+
+@sqlite_only
+class AdminQueryPlanTests(QueryPlanMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_orders(make_products(60), 400)
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'password', is_staff=True)
+        analyze()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_orders_console(self):
+        url = reverse('admin_panel:orders')
+        with self.assertNoFullScans():
+            response = self.client.get(url)
+            self.client.get(url, {'cursor': response.context['next_cursor']})
+            self.client.get(url, {'status': 'pending'})
+            self.client.get(url, {'search': 'buyer1'})
+            self.client.get(url, {'search': 'Петров'})
+            self.client.get(url, {'search': '#15'})
+
+    def test_products_list(self):
+        url = reverse('admin_panel:products')
+        with self.assertNoFullScans():
+            response = self.client.get(url)
+            self.client.get(url, {'cursor': response.context['next_cursor']})
+
+    def test_products_list_sales_in_one_query(self):
+        # Продажи не догружаются отдельным запросом для каждого товара
+        url = reverse('admin_panel:products')
+        self.client.get(url)
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        product = response.context['products'][0]
+        self.assertEqual(product.total_ordered, product.orderitem_set.aggregate(
+            total=Sum('quantity'))['total'] or 0)
+
+    def test_dashboard(self):
+        # Итоги по всем заказам, число товаров и лучшие товары за все время
+        # читают таблицы целиком; результат кэшируется в admin_panel.metrics
+        allowed = ['orders_order', 'orders_dailyproductsales', 'products_product']
+        with self.assertNoFullScans(allowed=allowed):
+            self.client.get(reverse('admin_panel:dashboard'))
+
+    def test_statistics(self):
+        self.client.get(reverse('admin_panel:dashboard'))
+        for period in ['today', 'week', 'month', 'year']:
+            with self.assertNoFullScans():
+                self.client.get(reverse('admin_panel:statistics'), {'period': period})
+
+
+class OrderSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.order = Order.objects.create(
+            first_name='Анна', last_name='Ёлкина-Щербакова', email='Anna.Elkina@Example.COM',
+            phone='+79001234567', address='ул. Ленина, 1', postal_code='101000', city='Москва',
+        )
+        Order.objects.create(
+            first_name='Иван', last_name='Петров', email='petrov@example.com',
+            phone='+79007654321', address='ул. Ленина, 2', postal_code='101000', city='Москва',
+        )
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'password', is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def search(self, query):
+        response = self.client.get(reverse('admin_panel:orders'), {'search': query})
+        return [order.pk for order in response.context['orders']]
+
+    def test_case_insensitive(self):
+        for query in ['ёлкина', 'ЁЛКИНА-Щ', 'Ёлк', 'anna.elkina@example', 'ANNA', '+7900123', f'#{self.order.pk}']:
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), [self.order.pk])
+
+    def test_lowered_copies_follow_edits(self):
+        self.order.last_name = 'Смирнова'
+        self.order.save()
+        self.assertEqual(self.search('смирн'), [self.order.pk])
+        self.assertEqual(self.search('ёлкина'), [])
+
+
+class OrderExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        products = make_products(2)
+        fields = {
+            'first_name': 'Анна', 'email': 'anna@example.com', 'postal_code': '101000', 'city': 'Москва',
+        }
+        cls.old = Order.objects.create(last_name='Старая', address='ул. Мира, 2', status='delivered', **fields)
+        cls.order = Order.objects.create(
+            last_name='Иванова', address='ул. "Садовая", д. 1, кв. 2', status='pending', **fields)
+        cls.empty = Order.objects.create(last_name='Пустая', address='ул. Мира, 3', status='pending', **fields)
+        OrderItem.objects.create(order=cls.old, product=products[0], price=Decimal('100'), quantity=1)
+        for product in products:
+            OrderItem.objects.create(order=cls.order, product=product, price=product.price, quantity=2)
+        Order.objects.filter(pk=cls.old.pk).update(created=timezone.now() - timedelta(days=10))
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'password', is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def export(self, **params):
+        response = self.client.get(reverse('admin_panel:orders_export'), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_has_row_per_item(self):
+        response, content = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        header, *rows = csv.reader(content.splitlines())
+        self.assertEqual(header[:3], ['order_id', 'created', 'status'])
+        rows = [dict(zip(header, row)) for row in rows]
+        self.assertEqual([row['order_id'] for row in rows],
+                         [str(pk) for pk in [self.old.pk, self.order.pk, self.order.pk, self.empty.pk]])
+        # Кавычки и запятые в адресе экранированы
+        self.assertEqual(rows[1]['address'], 'ул. "Садовая", д. 1, кв. 2')
+        self.assertEqual((rows[1]['product_name'], rows[1]['quantity'], rows[1]['order_total']),
+                         ('Товар 0', '2', '402.00'))
+        # Заказ без позиций - одна строка с пустыми полями товара
+        self.assertEqual((rows[3]['product_id'], rows[3]['quantity']), ('', ''))
+
+    def test_filters(self):
+        today = timezone.localdate()
+        _, content = self.export(format='ndjson', date_from=today.isoformat(), date_to=today.isoformat(), status='pending')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual({row['order_id'] for row in rows}, {self.order.pk, self.empty.pk})
+        self.assertEqual(rows[0]['last_name'], 'Иванова')
+
+        _, content = self.export(format='ndjson', date_to=(today - timedelta(days=10)).isoformat())
+        self.assertEqual([json.loads(line)['order_id'] for line in content.splitlines()], [self.old.pk])
+
+    def test_staff_only(self):
+        self.client.logout()
+        response = self.client.get(reverse('admin_panel:orders_export'))
+        self.assertEqual(response.status_code, 302)
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = make_products(5)
+        make_orders(cls.products, 60, days=400)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_matches_raw_aggregation(self):
+        metrics = get_metrics()
+        # Отмененные заказы не считаются продажами, как и в DailyProductSales
+        orders = Order.objects.exclude(status='cancelled').prefetch_related('items')
+        self.assertTrue(Order.objects.filter(status='cancelled', created__gte=period_start('month')).exists())
+        self.assertEqual(metrics['total_orders'], len(orders))
+        for period in PERIOD_DAYS:
+            in_period = [order for order in orders if order.created >= period_start(period)]
+            with self.subTest(period=period):
+                self.assertEqual(metrics[f'orders_{period}'], len(in_period))
+                self.assertEqual(
+                    metrics[f'revenue_{period}'],
+                    sum((item.price * item.quantity for order in in_period for item in order.items.all()), Decimal('0')),
+                )
+                self.assertEqual(
+                    metrics[f'order_items_{period}'],
+                    sum(item.quantity for order in in_period for item in order.items.all()),
+                )
+        self.assertEqual(metrics['total_products'], 5)
+
+    def test_statistics_totals_match_product_rows(self):
+        admin = User.objects.create_user('admin', 'admin@example.com', is_staff=True)
+        self.client.force_login(admin)
+        for period in PERIOD_DAYS:
+            with self.subTest(period=period):
+                context = self.client.get(reverse('admin_panel:statistics'), {'period': period}).context
+                rows = list(context['product_stats'])
+                self.assertEqual(sum(row['total_revenue'] for row in rows), context['total_revenue_period'])
+
+    def test_cached_until_data_changes(self):
+        metrics = get_metrics()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_metrics(), metrics)
+
+        order = Order.objects.order_by('-created').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderItem.objects.create(order=order, product=self.products[0], price=Decimal('1000'), quantity=1)
+        self.assertEqual(get_metrics()['revenue_today'], metrics['revenue_today'] + 1000)
 
-# Create your tests here.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[4].delete()
+        self.assertEqual(get_metrics()['total_products'], 4)
@@ -11,6 +11,7 @@ urlpatterns = [
     path('logout/', views.admin_logout, name='logout'),
     
     path('orders/', views.admin_orders, name='orders'),
+    path('orders/export/', views.admin_orders_export, name='orders_export'),
     path('orders/<int:order_id>/', views.admin_order_detail, name='order_detail'),
     
     path('products/', views.admin_products, name='products'),
@@ -19,6 +20,7 @@ urlpatterns = [
     path('products/<int:product_id>/delete/', views.admin_product_delete, name='product_delete'),
     
     path('statistics/', views.admin_statistics, name='statistics'),
+    path('cache-stats/', views.admin_cache_stats, name='cache_stats'),
 ]
 
 if settings.DEBUG:
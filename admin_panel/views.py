@@ -1,14 +1,21 @@
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import login, authenticate, logout
 from django.contrib import messages
-from django.db.models import Sum, Count, F
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum, Q
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_date
 from products.models import Product
-from orders.models import Order, OrderItem
+from products.cache import product_cache
+from products.page_cache import page_cache_stats
+from orders.models import DailyProductSales, Order
+from orders.export import FORMATS, export_lines
 from .forms import ProductForm, LoginForm
-from django.db.models import Sum
+from .metrics import PERIOD_DAYS, get_metrics, period_start
+from core.pagination import keyset_page
 
 
 def is_admin(user):
@@ -20,88 +27,98 @@ def is_admin(user):
 @login_required
 @user_passes_test(is_admin)
 def admin_dashboard(request):
-    # Статистика заказов
-    today = timezone.now().date()
-    week_ago = today - timedelta(days=7)
-    month_ago = today - timedelta(days=30)
-    year_ago = today - timedelta(days=365)
-    
-    # Общая статистика
-    total_orders = Order.objects.count() # Кол-во заказов
-    total_products = Product.objects.count() # Кол-во товаров
-    total_revenue = OrderItem.objects.aggregate(
-        total=Sum(F('quantity') * F('price'))
-    )['total'] or 0 # Сумма всех продаж
-    
-    # Статистика по периодам
-    orders_today = Order.objects.filter(created__date=today).count()
-    orders_week = Order.objects.filter(created__date__gte=week_ago).count()
-    orders_month = Order.objects.filter(created__date__gte=month_ago).count()
-    
-    revenue_today = OrderItem.objects.filter(
-        order__created__date=today
-    ).aggregate(total=Sum(F('quantity') * F('price')))['total'] or 0
-    
-    revenue_week = OrderItem.objects.filter(
-        order__created__date__gte=week_ago
-    ).aggregate(total=Sum(F('quantity') * F('price')))['total'] or 0
-    
-    revenue_month = OrderItem.objects.filter(
-        order__created__date__gte=month_ago
-    ).aggregate(total=Sum(F('quantity') * F('price')))['total'] or 0
-    
-    # Статусы заказов
-    order_statuses = Order.objects.values('status').annotate(
-        count=Count('id')
-    )
-    
-    popular_products_data = OrderItem.objects.values(
-        'product__id', 'product__name'
-    ).annotate(
-        total_ordered=Sum('quantity'), # Кол-во проданных товаров
-        total_revenue=Sum(F('quantity') * F('price'))  # Выручка
-    ).order_by('-total_ordered')[:10]
-    
-    context = {
-        'total_orders': total_orders, # Всего заказов
-        'total_revenue': total_revenue, # Общая выручка
-        'total_products': total_products, # Товаров в каталоге
-        'orders_today': orders_today, # Заказов за день
-        'orders_week': orders_week, # Заказов за неделю
-        'orders_month': orders_month, # Заказов за месяц
-        'revenue_today': revenue_today, # Общая выручка за день
-        'revenue_week': revenue_week, # Общая выручка за неделю
-        'revenue_month': revenue_month, # Общая выручка за месяц
-        'order_statuses': order_statuses, # Статусы заказов
-        'popular_products_data': popular_products_data, # Популярные товары
-    }
+    # Все показатели считаются одним запросом и берутся из кэша
+    context = get_metrics()
     return render(request, 'admin_panel/dashboard.html', context)
 
+def _prefix_filter(field, value):
+    """
+    Поиск по началу строки через диапазон значений.
+
+    В отличие от LIKE (в SQLite он регистронезависимый) такое условие
+    использует обычный индекс по полю.
+    """
+    return Q(**{f'{field}__gte': value, f'{field}__lt': value + '\uffff'})
+
+def _search_orders(orders, query):
+    """Поиск заказа по номеру, email, фамилии или телефону"""
+    query = query.strip().lstrip('#')
+    # Фамилия и email сравниваются с копиями в нижнем регистре (Order.*_lower)
+    lowered = query.lower()
+    conditions = (
+        _prefix_filter('email_lower', lowered) |
+        _prefix_filter('last_name_lower', lowered) |
+        _prefix_filter('phone', query)
+    )
+    if query.isdigit():
+        conditions |= Q(id=int(query))
+    return orders.filter(conditions)
+
 @login_required
 @user_passes_test(is_admin)
 def admin_orders(request):
-    orders = Order.objects.all().order_by('-created')
-    # Статусы заказов
-    order_statuses = Order.objects.values('status').annotate(
-        count=Count('id')
-    )
+    orders = Order.objects.all()
     
     # Фильтрация по статусу
     status_filter = request.GET.get('status')
     if status_filter:
         orders = orders.filter(status=status_filter)
     
+    # Поиск по номеру, email, фамилии и телефону
+    search_query = request.GET.get('search', '').strip()
+    if search_query:
+        orders = _search_orders(orders, search_query)
+    
+    # Постраничный вывод: keyset по (-created, -id), итоги берутся
+    # из сохраненных в заказе полей - один запрос на страницу
+    orders, next_cursor = keyset_page(
+        orders,
+        cursor=request.GET.get('cursor'),
+        per_page=settings.ADMIN_ORDERS_PAGE_SIZE,
+        date_field='created',
+    )
+    
     context = {
         'orders': orders,
         'status_filter': status_filter,
-        'order_statuses': order_statuses
+        'search_query': search_query,
+        'next_cursor': next_cursor,
+        'status_choices': Order.STATUS_CHOICES,
     }
     return render(request, 'admin_panel/orders.html', context)
 
+def _parse_date(value):
+    """Дата из параметра запроса (ГГГГ-ММ-ДД); некорректное значение игнорируется"""
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+@login_required
+@user_passes_test(is_admin)
+def admin_orders_export(request):
+    """Потоковая выгрузка заказов с позициями в CSV или NDJSON"""
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in FORMATS:
+        export_format = 'csv'
+    
+    # Фильтры: период (даты включительно) и статус
+    lines = export_lines(
+        export_format,
+        date_from=_parse_date(request.GET.get('date_from')),
+        date_to=_parse_date(request.GET.get('date_to')),
+        status=request.GET.get('status') or None,
+    )
+    
+    response = StreamingHttpResponse(lines, content_type=FORMATS[export_format])
+    filename = f'orders-{timezone.localdate():%Y%m%d}.{export_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 @login_required
 @user_passes_test(is_admin)
 def admin_order_detail(request, order_id):
-    order = get_object_or_404(Order, id=order_id)
+    order = get_object_or_404(Order.objects.prefetch_related('items__product'), id=order_id)
     
     if request.method == 'POST':
         new_status = request.POST.get('status')
@@ -119,9 +136,15 @@ def admin_order_detail(request, order_id):
 @login_required
 @user_passes_test(is_admin)
 def admin_products(request):
-    products = Product.objects.all().order_by('-created_at')
+    # Продажи по каждому товару страницы считаются в том же запросе
+    products, next_cursor = keyset_page(
+        Product.objects.with_sales_stats().defer('description'),
+        cursor=request.GET.get('cursor'),
+        per_page=settings.ADMIN_PRODUCTS_PAGE_SIZE,
+    )
     context = {
         'products': products,
+        'next_cursor': next_cursor,
     }
     return render(request, 'admin_panel/products.html', context)
 
@@ -182,94 +205,53 @@ def admin_product_delete(request, product_id):
 @user_passes_test(is_admin)
 def admin_statistics(request):
     period = request.GET.get('period', 'week')
-    
-    # Определяем период
-    today = timezone.now().date()
-    if period == 'today':
-        start_date = today
-        end_date = today + timedelta(days=1)
-    elif period == 'week':
-        start_date = today - timedelta(days=7)
-        end_date = today + timedelta(days=1)
-    elif period == 'month':
-        start_date = today - timedelta(days=30)
-        end_date = today + timedelta(days=1)
-    elif period == 'year':
-        start_date = today - timedelta(days=365)
-        end_date = today + timedelta(days=1)
-    else:
-        start_date = today - timedelta(days=7)
-        end_date = today + timedelta(days=1)
-    
-    # Статистика по товарам
-    product_stats = OrderItem.objects.filter(
-        order__created__range=[start_date, end_date]
+    if period not in PERIOD_DAYS:
+        period = 'week'
+    start = period_start(period)
+
+    # Статистика по товарам - из сводки продаж по дням
+    product_stats = DailyProductSales.objects.filter(
+        date__gte=start.date()
     ).values(
         'product__name'
     ).annotate(
         total_quantity=Sum('quantity'),
-        total_revenue=Sum(F('quantity') * F('price'))
+        total_revenue=Sum('revenue')
     ).order_by('-total_quantity')
-    
-    # Общая статистика за период
-    total_orders_period = Order.objects.filter(
-        created__range=[start_date, end_date]
-    ).count()
-    
-    total_revenue_period = OrderItem.objects.filter(
-        order__created__range=[start_date, end_date]
-    ).aggregate(total=Sum(F('quantity') * F('price')))['total'] or 0
-    
-    # Статистика для сравнения периодов
-    orders_today = Order.objects.filter(created__date=today).count()
-    orders_week = Order.objects.filter(created__date__gte=today - timedelta(days=7)).count()
-    orders_month = Order.objects.filter(created__date__gte=today - timedelta(days=30)).count()
-    
-    revenue_today = OrderItem.objects.filter(
-        order__created__date=today
-    ).aggregate(total=Sum(F('quantity') * F('price')))['total'] or 0
-    
-    revenue_week = OrderItem.objects.filter(
-        order__created__date__gte=today - timedelta(days=7)
-    ).aggregate(total=Sum(F('quantity') * F('price')))['total'] or 0
-    
-    revenue_month = OrderItem.objects.filter(
-        order__created__date__gte=today - timedelta(days=30)
-    ).aggregate(total=Sum(F('quantity') * F('price')))['total'] or 0
-    
-    # Количество товаров за периоды
-    order_items_today = OrderItem.objects.filter(
-        order__created__date=today
-    ).aggregate(total=Sum('quantity'))['total'] or 0
-    
-    order_items_week = OrderItem.objects.filter(
-        order__created__date__gte=today - timedelta(days=7)
-    ).aggregate(total=Sum('quantity'))['total'] or 0
-    
-    order_items_month = OrderItem.objects.filter(
-        order__created__date__gte=today - timedelta(days=30)
-    ).aggregate(total=Sum('quantity'))['total'] or 0
-    
+
+    # Общая статистика за период и для сравнения периодов - из сводных показателей
+    metrics = get_metrics()
     context = {
         'product_stats': product_stats,
         'period': period,
-        'total_orders_period': total_orders_period,
-        'total_revenue_period': total_revenue_period,
-        'start_date': start_date,
-        'end_date': end_date - timedelta(days=1),
-        # Для сравнения периодов
-        'orders_today': orders_today,
-        'orders_week': orders_week,
-        'orders_month': orders_month,
-        'revenue_today': revenue_today,
-        'revenue_week': revenue_week,
-        'revenue_month': revenue_month,
-        'order_items_today': order_items_today,
-        'order_items_week': order_items_week,
-        'order_items_month': order_items_month,
+        'total_orders_period': metrics[f'orders_{period}'],
+        'total_revenue_period': metrics[f'revenue_{period}'],
+        'start_date': start.date(),
+        'end_date': timezone.localdate(),
+        'orders_today': metrics['orders_today'],
+        'orders_week': metrics['orders_week'],
+        'orders_month': metrics['orders_month'],
+        'revenue_today': metrics['revenue_today'],
+        'revenue_week': metrics['revenue_week'],
+        'revenue_month': metrics['revenue_month'],
+        'order_items_today': metrics['order_items_today'],
+        'order_items_week': metrics['order_items_week'],
+        'order_items_month': metrics['order_items_month'],
     }
     return render(request, 'admin_panel/statistics.html', context)
 
+@login_required
+@user_passes_test(is_admin)
+def admin_cache_stats(request):
+    """Счетчики кэшей для мониторинга"""
+    return JsonResponse({
+        # Счетчики кэша страниц и кэша товаров - только этого процесса
+        'page_cache': page_cache_stats(),
+        'product_cache': product_cache.get_stats(),
+        # Заполненность общего кэша (есть только у core.cache_backends.SQLiteCache)
+        'shared_cache': cache.stats() if hasattr(cache, 'stats') else None,
+    })
+
 def admin_login(request):
     if request.user.is_authenticated and request.user.is_staff:
         return redirect('admin_panel:dashboard')
@@ -0,0 +1,44 @@
+import os
+import random
+from decimal import Decimal
+
+from core.testing import make_products
+
+# Доля полного объема данных: BENCHMARK_SCALE=1 - 10 тыс. товаров,
+# 100 тыс. заказов и около 1 млн строк заказов. По умолчанию - 1%,
+# чтобы проверка бюджетов запросов шла вместе с обычными тестами
+SCALE = float(os.environ.get('BENCHMARK_SCALE', '0.01'))
+
+PRODUCTS = 10_000
+ORDERS = 100_000
+ITEMS_PER_ORDER = 10
+
+KINDS = ['Чай', 'Кофе', 'Какао', 'Шоколад', 'Печенье', 'Мед', 'Джем', 'Орехи', 'Пряники', 'Зефир']
+VARIANTS = ['черный', 'зеленый', 'молотый', 'в зернах', 'горький', 'молочный',
+            'цветочный', 'липовый', 'клубничный', 'миндальный', 'имбирный', 'ванильный']
+
+
+def scaled(count):
+    return max(1, round(count * SCALE))
+
+
+def generate_products(count, seed=0):
+    """Каталог из count товаров с названиями для поиска и разными ценами"""
+    rng = random.Random(seed)
+    variants = [rng.choice(VARIANTS) for _ in range(count)]
+    packs = [rng.choice([100, 250, 500, 1000]) for _ in range(count)]
+    prices = [Decimal(rng.randrange(5000, 500000)) / 100 for _ in range(count)]
+    available = [rng.random() > 0.05 for _ in range(count)]
+
+    def title(i):
+        return f'{KINDS[i % len(KINDS)]} {variants[i]}'
+
+    return make_products(
+        count,
+        name=lambda i: f'{title(i)} №{i}',
+        slug=lambda i: f'bench-{i}',
+        description=lambda i: f'{title(i)}. Упаковка {packs[i]} г.',
+        price=lambda i: prices[i],
+        image=lambda i: f'products/bench-{i}.jpg',
+        is_available=lambda i: available[i],
+    )
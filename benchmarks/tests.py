@@ -0,0 +1,163 @@
+import json
+import os
+import statistics
+import time
+from collections import namedtuple
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.testing import analyze, make_orders
+from orders.models import Order
+from products.cache import product_cache
+from .data import ITEMS_PER_ORDER, ORDERS, PRODUCTS, SCALE, generate_products, scaled
+
+# Бюджет страницы: не больше queries SQL-запросов и ms миллисекунд
+# (медиана повторов, без кэша страниц и объектов) на полном объеме данных
+Budget = namedtuple('Budget', 'queries ms')
+
+BUDGETS = {
+    'home': Budget(queries=1, ms=50),
+    'search': Budget(queries=2, ms=60),
+    'product_detail': Budget(queries=1, ms=30),
+    'cart_detail': Budget(queries=1, ms=30),
+    'order_create': Budget(queries=6, ms=40),
+    'order_list': Budget(queries=3, ms=150),
+    'admin_dashboard': Budget(queries=5, ms=2000),
+    # Таблица статистики выводит все товары, проданные за период
+    'admin_statistics': Budget(queries=6, ms=8000),
+    'admin_orders': Budget(queries=3, ms=60),
+}
+
+# Сколько раз запрашивать каждую страницу
+REPEAT = int(os.environ.get('BENCHMARK_REPEAT', '3'))
+
+CHECKOUT_FORM = {
+    'first_name': 'Иван',
+    'last_name': 'Петров',
+    'email': 'shopper@example.com',
+    'phone': '+79000000000',
+    'address': 'ул. Ленина, 1',
+    'postal_code': '101000',
+    'city': 'Москва',
+}
+
+
+class ViewBudgetTests(TestCase):
+    """
+    Время и число SQL-запросов ключевых страниц на сгенерированных данных.
+
+    Объем задает BENCHMARK_SCALE (см. benchmarks.data). Бюджет запросов
+    от объема не зависит и ловит N+1 и на малых данных, бюджет времени
+    рассчитан на полный объем. С BENCHMARK_REPORT=путь результаты
+    записываются в файл JSON для сравнения между коммитами.
+    """
+
+    results = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = generate_products(scaled(PRODUCTS))
+        # Без пароля: входим через force_login, а хэширование паролей медленное
+        cls.customers = User.objects.bulk_create([
+            User(username=f'customer{i}', email=f'customer{i}@example.com')
+            for i in range(50)
+        ])
+        make_orders(cls.products, scaled(ORDERS), items_per_order=ITEMS_PER_ORDER, users=cls.customers)
+        call_command('rebuild_search_index', stdout=StringIO())
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', is_staff=True)
+        analyze()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        path = os.environ.get('BENCHMARK_REPORT')
+        if path:
+            report = {'scale': SCALE, 'repeat': REPEAT, 'views': cls.results}
+            with open(path, 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+
+    def fill_cart(self, count=5):
+        available = [product for product in self.products if product.is_available]
+        for product in available[:count]:
+            self.client.post(reverse('cart:cart_add', args=[product.pk]))
+
+    def measure(self, name, request, prepare=None):
+        """Запрашивает страницу REPEAT раз и сверяет худшее число запросов и медиану времени с бюджетом"""
+        timings, worst = [], []
+        for _ in range(REPEAT):
+            if prepare:
+                prepare()
+            cache.clear()
+            product_cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = request()
+                timings.append((time.perf_counter() - started) * 1000)
+            # Для сообщения об ошибке храним запросы повтора, где их было больше всего
+            if len(context) > len(worst):
+                worst = context.captured_queries
+            self.assertLess(response.status_code, 400, name)
+
+        budget = BUDGETS[name]
+        result = {
+            'queries': len(worst),
+            'ms': round(statistics.median(timings), 2),
+            'budget_queries': budget.queries,
+            'budget_ms': budget.ms,
+        }
+        self.results[name] = result
+        self.assertLessEqual(
+            result['queries'], budget.queries,
+            f'{name}: {result["queries"]} SQL-запросов при бюджете {budget.queries}\n'
+            + '\n'.join(query['sql'] for query in worst),
+        )
+        if SCALE >= 1:
+            self.assertLessEqual(result['ms'], budget.ms, f'{name}: {result["ms"]} мс при бюджете {budget.ms}')
+
+    def test_home(self):
+        self.measure('home', lambda: self.client.get(reverse('products:home')))
+
+    def test_search(self):
+        self.measure('search', lambda: self.client.get(reverse('products:home'), {'search': 'чай зеленый'}))
+
+    def test_product_detail(self):
+        url = reverse('products:product_detail', args=[self.products[len(self.products) // 2].slug])
+        self.measure('product_detail', lambda: self.client.get(url))
+
+    def test_cart_detail(self):
+        self.fill_cart()
+        self.measure('cart_detail', lambda: self.client.get(reverse('cart:cart_detail')))
+
+    def test_order_create(self):
+        self.measure(
+            'order_create',
+            lambda: self.client.post(reverse('orders:order_create'), CHECKOUT_FORM),
+            prepare=self.fill_cart,
+        )
+        self.assertEqual(Order.objects.filter(email=CHECKOUT_FORM['email']).count(), REPEAT)
+
+    def test_order_list(self):
+        self.client.force_login(self.customers[0])
+        self.measure('order_list', lambda: self.client.get(reverse('orders:order_list')))
+
+    def test_admin_dashboard(self):
+        self.client.force_login(self.admin)
+        self.measure('admin_dashboard', lambda: self.client.get(reverse('admin_panel:dashboard')))
+
+    def test_admin_orders(self):
+        self.client.force_login(self.admin)
+        self.measure('admin_orders', lambda: self.client.get(reverse('admin_panel:orders')))
+
+    def test_admin_statistics(self):
+        self.client.force_login(self.admin)
+        self.measure(
+            'admin_statistics',
+            lambda: self.client.get(reverse('admin_panel:statistics'), {'period': 'month'}),
+        )
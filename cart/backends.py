@@ -0,0 +1,306 @@
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Sum
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from products.cache import product_cache
+from .models import Cart, CartItem, CartSummary
+
+
+class BaseCartBackend:
+    """
+    Хранилище корзины текущего посетителя.
+
+    Реализация выбирается настройкой CART_BACKEND. Представления работают
+    только с этим интерфейсом и не знают, где лежат данные корзины.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    def get_summary(self):
+        """Строки корзины с товарами и итоги (CartSummary)"""
+        raise NotImplementedError
+
+    def count(self):
+        """Количество товаров для значка корзины"""
+        raise NotImplementedError
+
+    def increment(self, product_id, quantity=1):
+        """
+        Увеличивает количество товара, который уже лежит в корзине.
+
+        Возвращает False, если товара в корзине нет - тогда вызывающий
+        код проверяет товар и вызывает add().
+        """
+        raise NotImplementedError
+
+    def add(self, product, quantity=1):
+        """Добавляет товар в корзину (или увеличивает его количество)"""
+        raise NotImplementedError
+
+    def update(self, product_id, quantity):
+        """Меняет количество; возвращает False, если товара нет в корзине"""
+        raise NotImplementedError
+
+    def remove(self, product_id):
+        """Удаляет товар; возвращает False, если товара нет в корзине"""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def save(self, response):
+        """Сохраняет изменения в ответ (вызывается из CartMiddleware)"""
+
+    def logged_in(self):
+        """Посетитель вошел в аккаунт, и ключ сессии сменился (cart.signals)"""
+
+
+class SessionCartBackend(BaseCartBackend):
+    """
+    Корзина в виде словаря {id товара: количество}.
+
+    Хранится в сессии под ключом CART_SESSION_ID, строк Cart/CartItem
+    в БД не создает.
+    """
+
+    def __init__(self, request):
+        super().__init__(request)
+        self.modified = False
+        self.items = self.load()
+
+    def load(self):
+        return dict(self.request.session.get(settings.CART_SESSION_ID, {}))
+
+    def persist(self):
+        self.request.session[settings.CART_SESSION_ID] = self.items
+
+    def _changed(self):
+        self.modified = True
+        self.persist()
+
+    def get_summary(self):
+        products = product_cache.get_many([int(pk) for pk in self.items])
+        items = []
+        for pk, quantity in list(self.items.items()):
+            product = products.get(int(pk))
+            if product is None:
+                # Товар удален из каталога - убираем его и из корзины
+                del self.items[pk]
+                self._changed()
+                continue
+            items.append(CartItem(product=product, quantity=quantity))
+
+        total_price = sum((item.total_price for item in items), Decimal('0.00'))
+        return CartSummary(items, total_price, sum(item.quantity for item in items))
+
+    def count(self):
+        return sum(self.items.values())
+
+    def increment(self, product_id, quantity=1):
+        key = str(product_id)
+        if key not in self.items:
+            return False
+        self.items[key] += quantity
+        self._changed()
+        return True
+
+    def add(self, product, quantity=1):
+        key = str(product.id)
+        self.items[key] = self.items.get(key, 0) + quantity
+        self._changed()
+
+    def update(self, product_id, quantity):
+        key = str(product_id)
+        if key not in self.items:
+            return False
+        self.items[key] = quantity
+        self._changed()
+        return True
+
+    def remove(self, product_id):
+        if self.items.pop(str(product_id), None) is None:
+            return False
+        self._changed()
+        return True
+
+    def clear(self):
+        self.items = {}
+        self._changed()
+
+
+class CookieCartBackend(SessionCartBackend):
+    """
+    Та же корзина-словарь, но в отдельной подписанной cookie CART_SESSION_ID.
+
+    Не трогает ни сессию, ни БД, поэтому корзина анонимного посетителя
+    не вызывает ни одной записи в базу.
+    """
+
+    salt = 'cart.backends.CookieCartBackend'
+
+    def load(self):
+        value = self.request.get_signed_cookie(
+            settings.CART_SESSION_ID,
+            default=None,
+            salt=self.salt,
+            max_age=settings.SESSION_COOKIE_AGE,
+        )
+        try:
+            items = json.loads(value) if value else {}
+        except ValueError:
+            items = {}
+        return items if isinstance(items, dict) else {}
+
+    def persist(self):
+        pass
+
+    def save(self, response):
+        if not self.modified:
+            return
+        if not self.items:
+            response.delete_cookie(settings.CART_SESSION_ID)
+            return
+        response.set_signed_cookie(
+            settings.CART_SESSION_ID,
+            json.dumps(self.items, separators=(',', ':')),
+            salt=self.salt,
+            max_age=settings.SESSION_COOKIE_AGE,
+            secure=settings.SESSION_COOKIE_SECURE,
+            httponly=True,
+            samesite='Lax',
+        )
+
+
+class DatabaseCartBackend(BaseCartBackend):
+    """
+    Корзина в таблицах Cart/CartItem, привязанная к ключу сессии.
+
+    Количество для значка кэшируется в сессии и пересчитывается
+    при каждом изменении корзины.
+    """
+
+    count_session_key = 'cart_items_count'
+    # Ключ сессии, к которому привязана корзина. При входе Django меняет
+    # ключ сессии, сохраняя ее данные, - по этому значению корзину переносим
+    cart_session_key = 'cart_session_key'
+
+    def __init__(self, request):
+        super().__init__(request)
+        self._cart = None
+
+    def get_cart(self, create=False):
+        if self._cart is None:
+            session = self.request.session
+            if create and not session.session_key:
+                session.create()
+            if create:
+                self._cart, _ = Cart.objects.get_or_create(session_key=session.session_key)
+                session[self.cart_session_key] = session.session_key
+            elif session.session_key:
+                self._cart = Cart.objects.filter(session_key=session.session_key).first()
+        return self._cart
+
+    def _items(self):
+        # Строки корзины текущей сессии; фильтр по ключу сессии превращается
+        # в подзапрос, поэтому отдельный запрос самой корзины не нужен
+        return CartItem.objects.filter(cart__session_key=self.request.session.session_key)
+
+    def _update_count(self):
+        self.request.session[self.count_session_key] = self._items().aggregate(
+            total=Sum('quantity')
+        )['total'] or 0
+
+    def _changed(self, delta=None):
+        # updated_at нужен команде purge_carts для поиска брошенных корзин
+        Cart.objects.filter(
+            session_key=self.request.session.session_key
+        ).update(updated_at=timezone.now())
+
+        # Если изменение количества известно, значок пересчитывать не нужно
+        session = self.request.session
+        if delta is not None and self.count_session_key in session:
+            session[self.count_session_key] += delta
+        else:
+            self._update_count()
+
+    def get_summary(self):
+        cart = self.get_cart()
+        if cart is None:
+            return CartSummary([], Decimal('0.00'), 0)
+        return cart.get_summary()
+
+    def count(self):
+        session = self.request.session
+        if not session.session_key:
+            return 0
+        if self.count_session_key not in session:
+            self._update_count()
+        return session[self.count_session_key]
+
+    def increment(self, product_id, quantity=1):
+        if not self.request.session.session_key:
+            return False
+        updated = self._items().filter(product_id=product_id).update(
+            quantity=F('quantity') + quantity
+        )
+        if updated:
+            self._changed(delta=quantity)
+        return bool(updated)
+
+    def add(self, product, quantity=1):
+        cart = self.get_cart(create=True)
+        # Один оператор INSERT ... ON CONFLICT по unique_together (cart, product):
+        # одновременные клики не теряют обновления
+        table = CartItem._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (cart_id, product_id, quantity) VALUES (%s, %s, %s) '
+                'ON CONFLICT (cart_id, product_id) '
+                'DO UPDATE SET quantity = quantity + excluded.quantity',
+                [cart.id, product.id, quantity],
+            )
+        self._changed(delta=quantity)
+
+    def update(self, product_id, quantity):
+        if not self.request.session.session_key:
+            return False
+        updated = self._items().filter(product_id=product_id).update(quantity=quantity)
+        if updated:
+            self._changed()
+        return bool(updated)
+
+    def remove(self, product_id):
+        if not self.request.session.session_key:
+            return False
+        deleted, _ = self._items().filter(product_id=product_id).delete()
+        if deleted:
+            self._changed()
+        return bool(deleted)
+
+    def clear(self):
+        cart = self.get_cart()
+        if cart is not None:
+            cart.items.all().delete()
+        self.request.session[self.count_session_key] = 0
+
+    def logged_in(self):
+        session = self.request.session
+        previous = session.get(self.cart_session_key)
+        if previous and previous != session.session_key:
+            Cart.objects.filter(session_key=previous).update(session_key=session.session_key)
+            session[self.cart_session_key] = session.session_key
+            self._cart = None
+
+
+def get_cart(request):
+    """Корзина текущего запроса (один объект на запрос)"""
+    if not hasattr(request, '_cart'):
+        backend_class = import_string(settings.CART_BACKEND)
+        request._cart = backend_class(request)
+    return request._cart
@@ -0,0 +1,8 @@
+from .backends import get_cart
+
+
+def cart(request):
+    """Количество товаров в корзине для значка в шапке"""
+    return {
+        'cart_items_count': get_cart(request).count(),
+    }
@@ -0,0 +1,95 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from cart.models import Cart
+
+# Движки сессий, которые хранят данные в таблице django_session
+DB_SESSION_ENGINES = (
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет брошенные корзины и истекшие сессии небольшими пачками, '
+        'чтобы не держать блокировку записи SQLite. Подходит для запуска по cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--idle-days', type=int, default=30,
+            help='Удалять корзины, которые не менялись дольше указанного числа дней',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько строк удалять в одной транзакции',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0.1,
+            help='Пауза между пачками в секундах, чтобы пропустить запросы сайта',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, что будет удалено',
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        db_sessions = settings.SESSION_ENGINE in DB_SESSION_ENGINES
+
+        # Корзина брошена, если давно не менялась или ее сессия уже не действует
+        stale = Q(updated_at__lt=now - timedelta(days=options['idle_days']))
+        if db_sessions:
+            stale |= ~Q(session_key__in=Session.objects.filter(
+                expire_date__gt=now
+            ).values('session_key'))
+        carts = Cart.objects.filter(stale)
+        self._purge('Корзины', carts, 'id', options)
+
+        if db_sessions:
+            sessions = Session.objects.filter(expire_date__lt=now)
+            self._purge('Сессии', sessions, 'session_key', options)
+
+    def _purge(self, label, queryset, key, options):
+        if options['dry_run']:
+            self.stdout.write(f'{label}: будет удалено {queryset.count()}')
+            return
+
+        deleted = 0
+        last_key = None
+        started = time.monotonic()
+        while True:
+            # Идем по первичному ключу, чтобы каждая пачка начиналась
+            # с места, где закончилась предыдущая
+            batch = queryset.order_by(key)
+            if last_key is not None:
+                batch = batch.filter(**{f'{key}__gt': last_key})
+            keys = list(batch.values_list(key, flat=True)[:options['batch_size']])
+            if not keys:
+                break
+
+            # Короткая транзакция на пачку; строки корзины удаляются каскадом
+            with transaction.atomic():
+                count, _ = queryset.model.objects.filter(**{f'{key}__in': keys}).delete()
+            deleted += count
+            last_key = keys[-1]
+
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'{label}: удалено {deleted} строк, {deleted / elapsed:.0f} строк/с'
+            )
+            time.sleep(options['pause'])
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        rate = deleted / elapsed
+        self.stdout.write(self.style.SUCCESS(
+            f'{label}: всего удалено {deleted} строк за {elapsed:.1f} с ({rate:.0f} строк/с)'
+        ))
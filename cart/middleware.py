@@ -0,0 +1,12 @@
+class CartMiddleware:
+    """Сохраняет корзину в ответ, если за время запроса она изменилась"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        cart = getattr(request, '_cart', None)
+        if cart is not None:
+            cart.save(response)
+        return response
@@ -1,9 +1,32 @@
+from decimal import Decimal
+
 from django.db import models
 from products.models import Product
 
+
+class CartSummary:
+    """Строки корзины и итоги, загруженные один раз для шаблона"""
+
+    def __init__(self, items, total_price, total_quantity):
+        self.items = items
+        self.total_price = total_price
+        self.total_quantity = total_quantity
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
 class Cart(models.Model):
     session_key = models.CharField(max_length=40, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Время последнего изменения корзины - по нему находим брошенные корзины
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = 'Корзина'
@@ -12,13 +35,33 @@ class Cart(models.Model):
     def __str__(self):
         return f'Cart {self.session_key}'
 
+    def get_totals(self):
+        """Стоимость и количество товаров одним агрегирующим запросом"""
+        totals = self.items.aggregate(
+            total_price=models.Sum(models.F('quantity') * models.F('product__price')),
+            total_quantity=models.Sum('quantity'),
+        )
+        total_price = Decimal(totals['total_price'] or 0).quantize(Decimal('0.01'))
+        return total_price, totals['total_quantity'] or 0
+
+    def get_summary(self):
+        """
+        Содержимое корзины для отображения: строки вместе с товарами
+        (select_related) и итоги из БД - фиксированные два запроса
+        независимо от количества строк.
+        """
+        items = list(self.items.select_related('product'))
+        if not items:
+            return CartSummary([], Decimal('0.00'), 0)
+        return CartSummary(items, *self.get_totals())
+
     @property
     def total_price(self):
-        return sum(item.total_price for item in self.items.all())
+        return self.get_totals()[0]
 
     @property
     def total_quantity(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.get_totals()[1]
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
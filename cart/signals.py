@@ -0,0 +1,11 @@
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+from .backends import get_cart
+
+
+@receiver(user_logged_in)
+def keep_cart_on_login(sender, request, user, **kwargs):
+    # Корзина, собранная до входа, остается у посетителя
+    if request is not None:
+        get_cart(request).logged_in()
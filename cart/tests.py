@@ -1,3 +1,243 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.testing import make_products
+from products.cache import product_cache
+from .backends import DatabaseCartBackend
+from .models import Cart, CartItem
+
+BACKENDS = (
+    'cart.backends.CookieCartBackend',
+    'cart.backends.SessionCartBackend',
+    'cart.backends.DatabaseCartBackend',
+)
+
+
+class CartTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = make_products(3)
+
+    def setUp(self):
+        cache.clear()
+        product_cache.clear()
+
+    def add(self, product):
+        return self.client.post(reverse('cart:cart_add', args=[product.pk]))
+
+    def summary(self):
+        response = self.client.get(reverse('cart:cart_detail'))
+        return {item.product.pk: item.quantity for item in response.context['summary']}
+
+
+class CartBadgeTests(CartTestCase):
+    def badge(self):
+        return self.client.get(reverse('cart:cart_detail')).context['cart_items_count']
+
+    def test_badge_follows_changes(self):
+        first, second = self.products[:2]
+        for backend in BACKENDS:
+            with self.subTest(backend=backend), self.settings(CART_BACKEND=backend):
+                self.client.cookies.clear()
+                self.assertEqual(self.badge(), 0)
+                self.add(first)
+                self.add(first)
+                self.add(second)
+                self.assertEqual(self.badge(), 3)
+                self.client.post(reverse('cart:cart_update', args=[first.pk]), {'quantity': 5})
+                self.assertEqual(self.badge(), 6)
+                self.client.post(reverse('cart:cart_remove', args=[second.pk]))
+                self.assertEqual(self.badge(), 5)
+                self.client.post(reverse('cart:cart_update', args=[first.pk]), {'quantity': 0})
+                self.assertEqual(self.badge(), 0)
+
+    @override_settings(CART_BACKEND='cart.backends.DatabaseCartBackend')
+    def test_database_count_comes_from_session(self):
+        self.add(self.products[0])
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        dict(request.session)  # загружаем сессию до проверки
+        with self.assertNumQueries(0):
+            self.assertEqual(DatabaseCartBackend(request).count(), 1)
+
+
+class CartDetailTests(CartTestCase):
+    def test_totals(self):
+        # Цены товаров 100, 101 и 102
+        for backend in BACKENDS:
+            with self.subTest(backend=backend), self.settings(CART_BACKEND=backend):
+                self.client.cookies.clear()
+                for product in [self.products[0], self.products[2], self.products[2]]:
+                    self.add(product)
+                summary = self.client.get(reverse('cart:cart_detail')).context['summary']
+                self.assertEqual(summary.total_price, Decimal('304.00'))
+                self.assertEqual(summary.total_quantity, 3)
+                self.assertEqual([item.total_price for item in summary], [Decimal('100'), Decimal('204')])
+
+    @override_settings(CART_BACKEND='cart.backends.DatabaseCartBackend')
+    def test_queries_do_not_grow_with_items(self):
+        url = reverse('cart:cart_detail')
+        self.add(self.products[0])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as one_item:
+            self.client.get(url)
+        for product in self.products[1:]:
+            self.add(product)
+        with CaptureQueriesContext(connection) as three_items:
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['summary']), 3)
+        self.assertEqual(len(three_items), len(one_item))
+
+
+class CartAddTests(CartTestCase):
+    def test_add_twice_sums_quantity(self):
+        for backend in BACKENDS:
+            with self.subTest(backend=backend), self.settings(CART_BACKEND=backend):
+                self.client.cookies.clear()
+                self.add(self.products[0])
+                self.add(self.products[0])
+                self.add(self.products[1])
+                self.assertEqual(self.summary(), {self.products[0].pk: 2, self.products[1].pk: 1})
+
+    @override_settings(CART_BACKEND='cart.backends.DatabaseCartBackend')
+    def test_upsert_keeps_one_row(self):
+        self.add(self.products[0])
+        self.add(self.products[0])
+        self.assertEqual(CartItem.objects.get().quantity, 2)
+
+    def test_unavailable_product_is_not_added(self):
+        for backend in BACKENDS:
+            with self.subTest(backend=backend), self.settings(CART_BACKEND=backend):
+                self.client.cookies.clear()
+                product = self.products[2]
+                self.add(product)
+                product.is_available = False
+                product.save()
+
+                # Количество уже лежащего в корзине товара тоже не меняется
+                self.assertEqual(self.add(product).status_code, 404)
+                self.assertEqual(self.summary(), {product.pk: 1})
+
+                product.is_available = True
+                product.save()
+
+
+@override_settings(CART_BACKEND='cart.backends.DatabaseCartBackend')
+class ConcurrentCartAddTests(TransactionTestCase):
+    clicks = 8
+
+    def test_concurrent_clicks_are_not_lost(self):
+        product = make_products(1)[0]
+        client = Client()
+        client.post(reverse('cart:cart_add', args=[product.pk]))
+        barrier = threading.Barrier(self.clicks)
+        errors = []
+
+        def click():
+            try:
+                barrier.wait()
+                client.post(reverse('cart:cart_add', args=[product.pk]))
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=click) for _ in range(self.clicks)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(CartItem.objects.get().quantity, 1 + self.clicks)
+
+
+class CartBackendTests(CartTestCase):
+    @override_settings(CART_BACKEND='cart.backends.CookieCartBackend')
+    def test_cookie_cart_does_not_touch_database(self):
+        self.add(self.products[0])
+        self.add(self.products[1])
+        self.assertIn(settings.CART_SESSION_ID, self.client.cookies)
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(Session.objects.exists())
+        self.assertEqual(self.summary(), {self.products[0].pk: 1, self.products[1].pk: 1})
+
+    @override_settings(CART_BACKEND='cart.backends.CookieCartBackend')
+    def test_tampered_cookie_gives_empty_cart(self):
+        self.add(self.products[0])
+        self.client.cookies[settings.CART_SESSION_ID] = '{"%d": 100}' % self.products[0].pk
+        self.assertEqual(self.summary(), {})
+
+    @override_settings(CART_BACKEND='cart.backends.SessionCartBackend')
+    def test_session_cart_keeps_no_cart_rows(self):
+        self.add(self.products[0])
+        self.assertFalse(Cart.objects.exists())
+        self.assertEqual(self.summary(), {self.products[0].pk: 1})
+
+    def test_deleted_product_leaves_cart(self):
+        for backend in BACKENDS:
+            with self.subTest(backend=backend), self.settings(CART_BACKEND=backend):
+                self.client.cookies.clear()
+                product = make_products(1, slug=f'gone-{backend}')[0]
+                self.add(self.products[0])
+                self.add(product)
+                product.delete()
+                self.assertEqual(self.summary(), {self.products[0].pk: 1})
+
+    def test_cart_kept_on_login(self):
+        user = User.objects.create_user('shopper')
+        for backend in BACKENDS:
+            with self.subTest(backend=backend), self.settings(CART_BACKEND=backend):
+                self.client.logout()
+                self.client.cookies.clear()
+                self.add(self.products[0])
+                self.client.force_login(user)
+                self.assertEqual(self.summary(), {self.products[0].pk: 1})
+
+
+class PurgeCartsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        Session.objects.bulk_create([
+            Session(session_key='live', session_data='', expire_date=now + timedelta(days=1)),
+            Session(session_key='expired', session_data='', expire_date=now - timedelta(days=1)),
+        ])
+        carts = Cart.objects.bulk_create([
+            Cart(session_key=key) for key in ['live', 'idle', 'expired', 'missing']
+        ])
+        product = make_products(1)[0]
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product) for cart in carts])
+        # Корзина с действующей сессией, но давно не менявшаяся
+        Cart.objects.filter(session_key='idle').update(updated_at=now - timedelta(days=31))
+        Session.objects.create(session_key='idle', session_data='', expire_date=now + timedelta(days=1))
+
+    def purge(self, *args):
+        output = StringIO()
+        call_command('purge_carts', '--batch-size', '1', '--pause', '0', *args, stdout=output)
+        return output.getvalue()
+
+    def test_purges_stale_carts_and_sessions(self):
+        self.purge()
+        self.assertEqual(list(Cart.objects.values_list('session_key', flat=True)), ['live'])
+        self.assertEqual(list(CartItem.objects.values_list('cart__session_key', flat=True)), ['live'])
+        self.assertEqual(sorted(Session.objects.values_list('session_key', flat=True)), ['idle', 'live'])
+
+    def test_dry_run(self):
+        output = self.purge('--dry-run')
+        self.assertIn('Корзины: будет удалено 3', output)
+        self.assertIn('Сессии: будет удалено 1', output)
+        self.assertEqual(Cart.objects.count(), 4)
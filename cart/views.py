@@ -1,73 +1,60 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from django.http import Http404
+from django.shortcuts import render, redirect
 from django.views.decorators.http import require_POST
 from django.contrib import messages
-from products.models import Product
-from .models import Cart, CartItem
-
-def _get_cart(request):
-    if not request.session.session_key:
-        request.session.create()
-    
-    cart, created = Cart.objects.get_or_create(session_key=request.session.session_key)
-    return cart
+from products.cache import product_cache
+from .backends import get_cart
 
 def cart_detail(request):
-    cart = _get_cart(request)
+    cart = get_cart(request)
     context = {
-        'cart': cart,
+        'summary': cart.get_summary(),
     }
     return render(request, 'cart/detail.html', context)
 
 @require_POST
 def cart_add(request, product_id):
-    cart = _get_cart(request)
-    product = get_object_or_404(Product, id=product_id, is_available=True)
-    
-    cart_item, created = CartItem.objects.get_or_create(
-        cart=cart,
-        product=product,
-        defaults={'quantity': 1}
-    )
-    
-    if not created:
-        cart_item.quantity += 1
-        cart_item.save()
-        messages.success(request, f'Количество товара "{product.name}" увеличено')
+    # Доступность проверяем до любой записи в корзину; товар обычно
+    # уже в кэше процесса, поэтому проверка не стоит запроса к БД
+    product = product_cache.get(pk=product_id)
+    if product is None or not product.is_available:
+        raise Http404('Товар не найден')
+
+    cart = get_cart(request)
+    # Товар уже в корзине - увеличиваем количество одним запросом
+    if cart.increment(product.id):
+        messages.success(request, 'Количество товара увеличено')
     else:
+        cart.add(product)
         messages.success(request, f'Товар "{product.name}" добавлен в корзину')
     
     return redirect('products:home')
 
 @require_POST
 def cart_remove(request, product_id):
-    cart = _get_cart(request)
-    product = get_object_or_404(Product, id=product_id)
+    cart = get_cart(request)
     
-    try:
-        cart_item = CartItem.objects.get(cart=cart, product=product)
-        cart_item.delete()
-        messages.success(request, f'Товар "{product.name}" удален из корзины')
-    except CartItem.DoesNotExist:
+    if cart.remove(product_id):
+        messages.success(request, 'Товар удален из корзины')
+    else:
         messages.error(request, 'Товар не найден в корзине')
     
     return redirect('cart:cart_detail')
 
 @require_POST
 def cart_update(request, product_id):
-    cart = _get_cart(request)
-    product = get_object_or_404(Product, id=product_id)
+    cart = get_cart(request)
     quantity = int(request.POST.get('quantity', 1))
     
-    try:
-        cart_item = CartItem.objects.get(cart=cart, product=product)
-        if quantity > 0:
-            cart_item.quantity = quantity
-            cart_item.save()
-            messages.success(request, f'Количество товара "{product.name}" обновлено')
+    if quantity > 0:
+        if cart.update(product_id, quantity):
+            messages.success(request, 'Количество товара обновлено')
         else:
-            cart_item.delete()
-            messages.success(request, f'Товар "{product.name}" удален из корзины')
-    except CartItem.DoesNotExist:
-        messages.error(request, 'Товар не найден в корзине')
+            messages.error(request, 'Товар не найден в корзине')
+    else:
+        if cart.remove(product_id):
+            messages.success(request, 'Товар удален из корзины')
+        else:
+            messages.error(request, 'Товар не найден в корзине')
     
-    return redirect('cart:cart_detail')
\ No newline at end of file
+    return redirect('cart:cart_detail')
@@ -0,0 +1,256 @@
+import os
+import pickle
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entry (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_entry_expires_idx ON cache_entry (expires);
+CREATE INDEX IF NOT EXISTS cache_entry_accessed_idx ON cache_entry (accessed);
+
+CREATE TABLE IF NOT EXISTS cache_size (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    entries INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_size (id, entries) VALUES (1, 0);
+
+CREATE TRIGGER IF NOT EXISTS cache_entry_added AFTER INSERT ON cache_entry
+BEGIN
+    UPDATE cache_size SET entries = entries + 1 WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entry_removed AFTER DELETE ON cache_entry
+BEGIN
+    UPDATE cache_size SET entries = entries - 1 WHERE id = 1;
+END;
+"""
+
+# Не больше параметров в одном запросе (ограничение SQLite)
+CHUNK_SIZE = 500
+INT64 = 2 ** 63
+
+
+class SQLiteCache(BaseCache):
+    """
+    Кэш Django в файле SQLite, общий для всех процессов на сервере.
+
+    LOCATION - путь к файлу. Файл открывается в режиме WAL: чтения не
+    блокируют друг друга и запись, а запись занимает миллисекунды.
+    Целые числа хранятся как INTEGER, поэтому incr() - один атомарный
+    UPDATE и годится для счетчиков версий. Просроченные записи не видны
+    сразу, а удаляются при превышении MAX_ENTRIES вместе с давно не
+    читавшимися (LRU), как CULL_FREQUENCY в DatabaseCache.
+    """
+
+    # Время последнего чтения обновляется не чаще раза в столько секунд,
+    # иначе каждое чтение превращалось бы в запись
+    ACCESS_RESOLUTION = 1
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = Path(location)
+        self._connection = None
+        self._pid = None
+
+    @property
+    def connection(self):
+        # Экземпляр кэша у каждого потока свой (django.core.cache.caches),
+        # а после fork соединение родителя использовать нельзя
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = self._connect()
+            self._pid = os.getpid()
+        return self._connection
+
+    def _connect(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        try:
+            connection.executescript(f'BEGIN IMMEDIATE; {SCHEMA} COMMIT;')
+        except sqlite3.Error:
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            raise
+        return connection
+
+    @contextmanager
+    def _write(self):
+        """Транзакция, которая сразу берет блокировку записи"""
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    @staticmethod
+    def _dump(value):
+        if type(value) is int and -INT64 <= value < INT64:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _load(value):
+        return value if isinstance(value, int) else pickle.loads(value)
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def _touch_accessed(self, rows, now):
+        stale = [(now, key) for key, accessed in rows if accessed < now - self.ACCESS_RESOLUTION]
+        if stale:
+            self.connection.executemany('UPDATE cache_entry SET accessed = ? WHERE key = ?', stale)
+
+    def _select(self, keys, now):
+        rows = []
+        for start in range(0, len(keys), CHUNK_SIZE):
+            chunk = keys[start:start + CHUNK_SIZE]
+            rows += self.connection.execute(
+                'SELECT key, value, accessed FROM cache_entry '
+                f'WHERE key IN ({",".join("?" * len(chunk))}) '
+                'AND (expires IS NULL OR expires > ?)',
+                [*chunk, now],
+            ).fetchall()
+        self._touch_accessed([(key, accessed) for key, _, accessed in rows], now)
+        return {key: self._load(value) for key, value, _ in rows}
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        found = self._select([key], time.time())
+        return found.get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_and_validate_key(key, version=version): key for key in keys}
+        found = self._select(list(keys), time.time())
+        return {keys[key]: value for key, value in found.items()}
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self.connection.execute(
+            'SELECT 1 FROM cache_entry WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            [key, time.time()],
+        ).fetchone()
+        return row is not None
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        expires = self._expires(timeout)
+        rows = [
+            (self.make_and_validate_key(key, version=version), self._dump(value), expires, now)
+            for key, value in data.items()
+        ]
+        with self._write() as connection:
+            connection.executemany(
+                'INSERT INTO cache_entry (key, value, expires, accessed) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET '
+                'value = excluded.value, expires = excluded.expires, accessed = excluded.accessed',
+                rows,
+            )
+            self._cull(connection, now)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        with self._write() as connection:
+            # Существующая запись заменяется, только если она просрочена
+            added = connection.execute(
+                'INSERT INTO cache_entry (key, value, expires, accessed) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET '
+                'value = excluded.value, expires = excluded.expires, accessed = excluded.accessed '
+                'WHERE cache_entry.expires <= ?',
+                [key, self._dump(value), self._expires(timeout), now, now],
+            ).rowcount
+            if added:
+                self._cull(connection, now)
+        return bool(added)
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        row = self.connection.execute(
+            'UPDATE cache_entry SET value = value + ? '
+            "WHERE key = ? AND typeof(value) = 'integer' AND (expires IS NULL OR expires > ?) "
+            'RETURNING value',
+            [delta, key, now],
+        ).fetchall()
+        if row:
+            return row[0][0]
+
+        # Не целое число (например, Decimal) - читаем и пишем в одной транзакции
+        with self._write() as connection:
+            row = connection.execute(
+                'SELECT value FROM cache_entry WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                [key, now],
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = self._load(row[0]) + delta
+            connection.execute(
+                'UPDATE cache_entry SET value = ? WHERE key = ?', [self._dump(value), key],
+            )
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return bool(self.connection.execute(
+            'UPDATE cache_entry SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            [self._expires(timeout), key, time.time()],
+        ).rowcount)
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return bool(self.connection.execute(
+            'DELETE FROM cache_entry WHERE key = ?', [key],
+        ).rowcount)
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        with self._write() as connection:
+            connection.executemany('DELETE FROM cache_entry WHERE key = ?', [(key,) for key in keys])
+
+    def clear(self):
+        with self._write() as connection:
+            connection.execute('DELETE FROM cache_entry')
+
+    def _cull(self, connection, now):
+        """Удаляет просроченные, а затем давно не читавшиеся записи сверх MAX_ENTRIES"""
+        entries = connection.execute('SELECT entries FROM cache_size').fetchone()[0]
+        if entries <= self._max_entries:
+            return
+        connection.execute('DELETE FROM cache_entry WHERE expires <= ?', [now])
+        entries = connection.execute('SELECT entries FROM cache_size').fetchone()[0]
+        if entries <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            connection.execute('DELETE FROM cache_entry')
+            return
+        connection.execute(
+            'DELETE FROM cache_entry WHERE key IN '
+            '(SELECT key FROM cache_entry ORDER BY accessed LIMIT ?)',
+            [entries // self._cull_frequency],
+        )
+
+    def stats(self):
+        """Число записей и размер файла (для страницы статистики кэшей)"""
+        entries = self.connection.execute('SELECT entries FROM cache_size').fetchone()[0]
+        size = sum(
+            path.stat().st_size
+            for path in (self.path, self.path.with_name(self.path.name + '-wal'))
+            if path.exists()
+        )
+        return {'entries': entries, 'max_entries': self._max_entries, 'bytes': size}
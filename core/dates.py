@@ -0,0 +1,13 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+
+def day_start(day):
+    """Полночь дня day в текущем часовом поясе (aware datetime)"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def day_range(day):
+    """Полуоткрытый интервал [начало дня, начало следующего дня)"""
+    return day_start(day), day_start(day + timedelta(days=1))
@@ -0,0 +1,63 @@
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Ошибки SQLite, после которых запись можно просто повторить
+LOCK_ERRORS = ('database is locked', 'database table is locked')
+
+# Счетчики повторов в этом процессе (для нагрузочных прогонов)
+lock_stats = {'retries': 0, 'failures': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        lock_stats[name] += 1
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    """Применяет SQLITE_PRAGMAS к каждому новому соединению с SQLite"""
+    if connection.vendor != 'sqlite' or not settings.SQLITE_TUNING:
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_lock_error(error):
+    return isinstance(error, OperationalError) and str(error) in LOCK_ERRORS
+
+
+def retry_on_lock(func):
+    """
+    Повторяет запись, если SQLite не дал блокировку за busy_timeout.
+
+    Задержка растет вдвое с каждой попыткой (DB_LOCK_RETRY_DELAY, 2x, 4x...)
+    и случайно растягивается в полтора раза в обе стороны, чтобы
+    столкнувшиеся запросы не повторяли попытку одновременно.
+    Внутри чужой транзакции не повторяет: ее нужно начинать заново целиком.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        retries = settings.DB_LOCK_RETRIES
+        for attempt in range(retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as error:
+                if not is_lock_error(error) or transaction.get_connection().in_atomic_block:
+                    raise
+                if attempt == retries:
+                    _count('failures')
+                    raise
+                _count('retries')
+                delay = settings.DB_LOCK_RETRY_DELAY * 2 ** attempt
+                time.sleep(random.uniform(delay / 2, delay * 1.5))
+
+    return wrapper
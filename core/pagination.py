@@ -0,0 +1,55 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def encode_cursor(value, pk):
+    """Кодирует позицию (значение сортировки, id) в строку для URL"""
+    value = value.isoformat() if isinstance(value, datetime) else repr(value)
+    raw = f'{value}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, parse=datetime.fromisoformat):
+    """Разбирает курсор; для некорректного значения возвращает None"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        value, pk = raw.split('|')
+        return parse(value), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_page(queryset, cursor=None, per_page=24, date_field='created_at'):
+    """
+    Keyset-пагинация по убыванию (date_field, id).
+
+    Вместо OFFSET фильтруем по последней показанной позиции, поэтому
+    глубокие страницы стоят столько же, сколько первая.
+    Возвращает список объектов страницы и курсор следующей страницы (или None).
+    """
+    queryset = queryset.order_by(f'-{date_field}', '-id')
+
+    position = decode_cursor(cursor)
+    if position:
+        moment, pk = position
+        # Первое условие задает диапазон по индексу,
+        # второе отсекает уже показанные записи с той же датой
+        queryset = queryset.filter(
+            Q(**{f'{date_field}__lte': moment}),
+            Q(**{f'{date_field}__lt': moment}) | Q(id__lt=pk),
+        )
+
+    # Берем на одну запись больше, чтобы узнать, есть ли следующая страница
+    items = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, date_field), last.id)
+
+    return items, next_cursor
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
 
+    'core',
     'products',
     'cart',
     'orders',
@@ -51,6 +52,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'cart.middleware.CartMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -67,6 +69,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'cart.context_processors.cart',
+                'products.context_processors.page_cache',
             ],
         },
     },
@@ -78,13 +82,61 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# Профиль SQLite для работы под нагрузкой (core.db): PRAGMA для каждого
+# соединения и BEGIN IMMEDIATE для транзакций. С BEGIN IMMEDIATE транзакция
+# сразу берет блокировку записи и ждет ее по busy_timeout, а не получает
+# "database is locked" посередине, когда чтение переходит в запись
+SQLITE_TUNING = True
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    # 256 МБ файла БД читаются через mmap, без копирования в кэш страниц
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение - размер кэша в КБ (64 МБ на соединение)
+    'cache_size': -64000,
+    # Сколько миллисекунд ждать блокировку записи
+    'busy_timeout': 5000,
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'} if SQLITE_TUNING else {},
+        # Тесты работают с файлом, а не с БД в памяти: так в них работают
+        # WAL и блокировки, как на сервере
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    }
+}
+
+# Сколько раз повторять оформление заказа, если блокировку записи не
+# удалось получить за busy_timeout (0 - не повторять), и задержка перед
+# первым повтором в секундах (см. core.db.retry_on_lock)
+DB_LOCK_RETRIES = 3
+DB_LOCK_RETRY_DELAY = 0.05
+
+# Кэш в файле SQLite (core.cache_backends.SQLiteCache): общий для всех
+# процессов gunicorn на сервере, поэтому версии каталога и сброс кэша
+# видны всем воркерам сразу. MAX_ENTRIES - предел числа записей,
+# сверх него удаляется 1/CULL_FREQUENCY давно не читавшихся
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': BASE_DIR / 'cache.sqlite3',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+            'CULL_FREQUENCY': 4,
+        },
+        # Тесты очищают кэш, поэтому работают со своим файлом
+        # (подставляет core.testing.TestRunner, как TEST NAME у БД)
+        'TEST': {'LOCATION': BASE_DIR / 'test_cache.sqlite3'},
     }
 }
 
+TEST_RUNNER = 'core.testing.TestRunner'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -127,8 +179,51 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Уменьшенные копии изображений товаров: имя -> ширина в пикселях.
+# Ширины взяты с запасом под экраны с двойной плотностью пикселей
+PRODUCT_IMAGE_RENDITIONS = {
+    'thumb': 160,   # корзина, заказы, списки в админ-панели (80px)
+    'card': 480,    # карточка каталога
+    'detail': 1200, # страница товара
+}
+
+# Форматы копий и качество сжатия
+PRODUCT_IMAGE_FORMATS = {
+    'webp': 80,
+    'jpeg': 82,
+}
+
 CART_SESSION_ID = 'cart'
 
+# Где хранится корзина посетителя:
+# cart.backends.CookieCartBackend - подписанная cookie, без записей в БД
+# cart.backends.SessionCartBackend - сессия
+# cart.backends.DatabaseCartBackend - таблицы Cart/CartItem
+CART_BACKEND = 'cart.backends.CookieCartBackend'
+
+# Количество товаров на одной странице каталога
+CATALOG_PAGE_SIZE = 24
+
+# Количество заказов на одной странице админ-панели
+ADMIN_ORDERS_PAGE_SIZE = 50
+
+# Количество товаров на одной странице админ-панели
+ADMIN_PRODUCTS_PAGE_SIZE = 50
+
+# Сколько секунд страницы каталога и товаров для анонимных
+# посетителей хранятся в кэше (см. products.page_cache)
+PAGE_CACHE_TIMEOUT = 300
+
+# Кэш объектов Product (products.cache): сколько товаров держать в памяти
+# каждого процесса, какой кэш из CACHES использовать как общий (None - без него)
+# и сколько секунд записи живут в общем кэше
+PRODUCT_CACHE_SIZE = 1000
+PRODUCT_CACHE_SHARED = None
+PRODUCT_CACHE_TIMEOUT = 3600
+
+# Сколько секунд сводные показатели админ-панели живут в кэше
+ADMIN_METRICS_CACHE_TTL = 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -0,0 +1,221 @@
+import random
+import re
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from products.models import Product
+
+# Проверки планов рассчитаны на EXPLAIN QUERY PLAN из SQLite
+sqlite_only = skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN есть только в SQLite')
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Запуск тестов с отдельными файлами кэшей.
+
+    Для кэшей с CACHES[...]['TEST']['LOCATION'] на время тестов подставляется
+    этот путь, и файл создается заново - как тестовая БД по TEST NAME.
+    Иначе cache.clear() в тестах очищал бы общий кэш сервера.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        caches = {}
+        self._cache_files = []
+        for alias, params in settings.CACHES.items():
+            location = params.get('TEST', {}).get('LOCATION')
+            if location:
+                params = dict(params, LOCATION=location)
+                self._cache_files.append(Path(location))
+            caches[alias] = params
+        self._remove_cache_files()
+        self._caches = override_settings(CACHES=caches)
+        self._caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.disable()
+        self._remove_cache_files()
+        super().teardown_test_environment(**kwargs)
+
+    def _remove_cache_files(self):
+        for path in self._cache_files:
+            for name in (path.name, f'{path.name}-wal', f'{path.name}-shm'):
+                path.with_name(name).unlink(missing_ok=True)
+
+
+def explain(sql, params=()):
+    """Строки плана EXPLAIN QUERY PLAN для запроса"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(plan, limited=False):
+    """
+    Шаги плана, которые читают таблицу (или индекс) целиком.
+
+    SCAN по индексу допустим только в запросе с LIMIT: это обход в порядке
+    ORDER BY, который останавливается на первой странице. Подзапросы
+    и виртуальные таблицы (FTS5) не учитываются.
+    """
+    return [
+        step for step in plan
+        if step.startswith('SCAN ')
+        and 'VIRTUAL TABLE' not in step
+        and not step.startswith(('SCAN (', 'SCAN CONSTANT ROW'))
+        and not (limited and 'USING' in step)
+    ]
+
+
+def _has_limit(sql):
+    return re.search(r'\bLIMIT\b', sql, re.IGNORECASE) is not None
+
+
+def analyze():
+    """
+    Собирает статистику SQLite (ANALYZE).
+
+    Без нее планировщик считает все таблицы одинаково большими,
+    и на почти пустой тестовой базе планы отличаются от настоящих.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+class QueryPlanMixin:
+    """Проверки для TestCase: запросы не должны читать таблицы целиком"""
+
+    def assertNoFullScan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        plan = explain(sql, params)
+        scans = full_scans(plan, limited=_has_limit(sql))
+        if scans:
+            self.fail(f'Полное сканирование {scans}\nЗапрос: {sql}\nПлан: {plan}')
+
+    @contextmanager
+    def assertNoFullScans(self, allowed=()):
+        """
+        Проверяет планы всех SELECT, выполненных внутри блока.
+
+        allowed - таблицы, полное чтение которых ожидаемо
+        (например, итоги по всем заказам в сводке админ-панели).
+        """
+        with CaptureQueriesContext(connection) as context:
+            yield
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            plan = explain(sql)
+            scans = [
+                step for step in full_scans(plan, limited=_has_limit(sql))
+                if step.split()[1] not in allowed
+            ]
+            if scans:
+                self.fail(f'Полное сканирование {scans}\nЗапрос: {sql}\nПлан: {plan}')
+
+
+# Сколько объектов вставлять одним bulk_create
+BATCH_SIZE = 2000
+
+CITIES = ['Москва', 'Санкт-Петербург', 'Казань', 'Новосибирск', 'Екатеринбург']
+# Большинство заказов доставлено, как на настоящем сайте
+STATUSES = ['delivered'] * 6 + ['shipped', 'processing', 'pending', 'cancelled']
+
+
+def _batches(iterable, size=BATCH_SIZE):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def make_products(count, **fields):
+    """
+    count товаров: «Товар 0», product-0, цена 100 + номер.
+
+    Любое поле можно задать значением или функцией от номера товара,
+    например name=lambda i: f'Чай №{i}'.
+    """
+    fields = {
+        'name': lambda i: f'Товар {i}',
+        'slug': lambda i: f'product-{i}',
+        'description': lambda i: f'Описание товара {i}',
+        'price': lambda i: Decimal(100 + i),
+        'image': lambda i: f'products/{i}.jpg',
+        **fields,
+    }
+    return Product.objects.bulk_create([
+        Product(**{
+            name: value(i) if callable(value) else value
+            for name, value in fields.items()
+        })
+        for i in range(count)
+    ], batch_size=BATCH_SIZE)
+
+
+def make_orders(products, count, days=365, items_per_order=2, users=(), seed=0):
+    """
+    count заказов, равномерно разнесенных по последним days дням,
+    в среднем по items_per_order строк.
+
+    Заказы вставляются пачками вместе с итогами, поэтому годятся и для
+    нагрузочных объемов. Сводку продаж заполняет та же команда, что и на
+    сервере. Каждый десятый заказ принадлежит одному из users (если заданы).
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    step = timedelta(days=days) / count
+
+    created = []
+    for numbers in _batches(range(count)):
+        orders, lines = [], []
+        for number in numbers:
+            picked = rng.sample(products, min(len(products), rng.randint(1, 2 * items_per_order - 1)))
+            quantities = [rng.randint(1, 3) for _ in picked]
+            lines.append(list(zip(picked, quantities)))
+            orders.append(Order(
+                user=users[number // 10 % len(users)] if users and number % 10 == 0 else None,
+                first_name='Иван',
+                last_name=f'Петров{number}',
+                email=f'buyer{number}@example.com',
+                phone=f'+7900{number:07d}',
+                address='ул. Ленина, 1',
+                postal_code='101000',
+                city=rng.choice(CITIES),
+                status=rng.choice(STATUSES),
+                total_cost=sum(product.price * quantity for product, quantity in lines[-1]),
+                items_count=sum(quantities),
+            ))
+        orders = Order.objects.bulk_create(orders)
+
+        # created заполняется auto_now_add при вставке, даты разносим отдельно
+        for number, order in zip(numbers, orders):
+            order.created = now - step * number
+        Order.objects.bulk_update(orders, ['created'])
+
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, price=product.price, quantity=quantity)
+            for order, order_lines in zip(orders, lines)
+            for product, quantity in order_lines
+        ])
+        created += orders
+
+    call_command('rebuild_daily_sales', stdout=StringIO())
+    return created
@@ -0,0 +1,163 @@
+import multiprocessing
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import OperationalError, connection, connections, transaction
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from products.models import Product
+from .cache_backends import SQLiteCache
+from .db import lock_stats, retry_on_lock
+from .testing import make_products, sqlite_only
+
+
+def _incr_many(path, count):
+    cache = SQLiteCache(path, {})
+    for _ in range(count):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'cache.sqlite3'
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_values(self):
+        self.cache.set('product', {'name': 'Чай', 'price': Decimal('9.00')})
+        self.cache.set_many({'a': 1, 'b': [1, 2]})
+        self.assertEqual(self.cache.get('product'), {'name': 'Чай', 'price': Decimal('9.00')})
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': [1, 2]})
+        self.assertTrue(self.cache.delete('a'))
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.clear()
+        self.assertFalse(self.cache.has_key('b'))
+
+    def test_expiry(self):
+        self.cache.set('old', 1, timeout=-1)
+        self.assertIsNone(self.cache.get('old'))
+        self.assertFalse(self.cache.touch('old'))
+        # Просроченную запись add() заменяет, живую - нет
+        self.assertTrue(self.cache.add('old', 2))
+        self.assertFalse(self.cache.add('old', 3))
+        self.assertEqual(self.cache.get('old'), 2)
+        self.cache.set('forever', 1, timeout=None)
+        self.assertFalse(self.cache.add('forever', 2))
+
+    def test_incr(self):
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 5), 6)
+        self.assertEqual(self.cache.decr('counter'), 5)
+        self.cache.set('amount', Decimal('1.50'))
+        self.assertEqual(self.cache.incr('amount'), Decimal('2.50'))
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('counter', 0, timeout=None)
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_incr_many, args=(self.path, 200)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 800)
+
+    def test_tests_use_own_cache_file(self):
+        # Очистка кэша в тестах не должна задевать общий кэш сервера
+        self.assertEqual(caches['default'].path, Path(settings.CACHES['default']['TEST']['LOCATION']))
+
+    def test_cull_keeps_recently_read(self):
+        cache = self.make_cache(MAX_ENTRIES=10, CULL_FREQUENCY=2)
+        cache.ACCESS_RESOLUTION = -1
+        for i in range(10):
+            cache.set(f'key-{i}', i)
+        cache.get('key-0')
+        cache.set('key-10', 10)
+        cache.set('key-11', 11)
+        self.assertLessEqual(cache.stats()['entries'], 10)
+        self.assertEqual(cache.get('key-0'), 0)
+        self.assertIsNone(cache.get('key-1'))
+
+
+@sqlite_only
+class SQLiteProfileTests(TransactionTestCase):
+    def test_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    def test_read_then_write_transactions(self):
+        # С отложенной транзакцией все, кроме первой, получили бы
+        # "database is locked" при переходе от чтения к записи
+        product = make_products(1)[0]
+        barrier = threading.Barrier(4)
+        errors = []
+
+        def rename(number):
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    Product.objects.get(pk=product.pk)
+                    time.sleep(0.05)
+                    Product.objects.filter(pk=product.pk).update(name=f'Товар {number}')
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=rename, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+
+@override_settings(DB_LOCK_RETRIES=2, DB_LOCK_RETRY_DELAY=0)
+class RetryOnLockTests(SimpleTestCase):
+    def test_retries_lock_errors(self):
+        func = mock.Mock(side_effect=[OperationalError('database is locked'), 'ok'])
+        retries = lock_stats['retries']
+        self.assertEqual(retry_on_lock(func)(), 'ok')
+        self.assertEqual(func.call_count, 2)
+        self.assertEqual(lock_stats['retries'], retries + 1)
+
+    def test_counts_retries_from_threads(self):
+        retries = lock_stats['retries']
+
+        def retry_many():
+            for _ in range(500):
+                func = mock.Mock(side_effect=[OperationalError('database is locked'), 'ok'])
+                retry_on_lock(func)()
+
+        threads = [threading.Thread(target=retry_many) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(lock_stats['retries'], retries + 2000)
+
+    def test_gives_up(self):
+        func = mock.Mock(side_effect=OperationalError('database is locked'))
+        with self.assertRaises(OperationalError):
+            retry_on_lock(func)()
+        self.assertEqual(func.call_count, 3)
+
+    def test_other_errors_are_not_retried(self):
+        func = mock.Mock(side_effect=OperationalError('no such table: x'))
+        with self.assertRaises(OperationalError):
+            retry_on_lock(func)()
+        self.assertEqual(func.call_count, 1)
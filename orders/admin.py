@@ -7,8 +7,9 @@ class OrderItemInline(admin.TabularInline):
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['id', 'first_name', 'last_name', 'email', 'address', 'city', 'status', 'created', 'updated']
+    list_display = ['id', 'first_name', 'last_name', 'email', 'address', 'city', 'status', 'total_cost', 'created', 'updated']
     list_filter = ['status', 'created', 'updated']
     list_editable = ['status']
+    readonly_fields = ['total_cost', 'items_count']
     inlines = [OrderItemInline]
     search_fields = ['first_name', 'last_name', 'email']
\ No newline at end of file
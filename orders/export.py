@@ -0,0 +1,88 @@
+import csv
+import json
+from datetime import timedelta
+
+from django.utils import timezone
+
+from core.dates import day_start
+from .models import Order
+
+# Колонки выгрузки: одна строка на позицию заказа
+# (заказ без позиций выгружается одной строкой с пустыми полями товара)
+EXPORT_FIELDS = [
+    ('order_id', 'id'),
+    ('created', 'created'),
+    ('status', 'status'),
+    ('first_name', 'first_name'),
+    ('last_name', 'last_name'),
+    ('email', 'email'),
+    ('phone', 'phone'),
+    ('city', 'city'),
+    ('postal_code', 'postal_code'),
+    ('address', 'address'),
+    ('order_total', 'total_cost'),
+    ('product_id', 'items__product_id'),
+    ('product_name', 'items__product__name'),
+    ('price', 'items__price'),
+    ('quantity', 'items__quantity'),
+]
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def export_rows(date_from=None, date_to=None, status=None, chunk_size=2000):
+    """
+    Строки выгрузки заказов в виде словарей.
+
+    Данные читаются через iterator(chunk_size), поэтому в памяти
+    одновременно находится не больше одной порции строк.
+    date_to включительно.
+    """
+    orders = Order.objects.all()
+    if date_from:
+        orders = orders.filter(created__gte=day_start(date_from))
+    if date_to:
+        orders = orders.filter(created__lt=day_start(date_to + timedelta(days=1)))
+    if status:
+        orders = orders.filter(status=status)
+
+    # Порядок по дате создания: фильтр по периоду и сортировка
+    # обслуживаются одним индексом order_created_idx
+    names = [name for name, _ in EXPORT_FIELDS]
+    rows = orders.order_by('created', 'id', 'items__id').values_list(
+        *[lookup for _, lookup in EXPORT_FIELDS]
+    )
+    for values in rows.iterator(chunk_size=chunk_size):
+        row = dict(zip(names, values))
+        row['created'] = timezone.localtime(row['created']).isoformat()
+        yield row
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in EXPORT_FIELDS])
+    for row in rows:
+        yield writer.writerow(row.values())
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False, default=str) + '\n'
+
+
+def export_lines(export_format, **filters):
+    """Итератор строк выгрузки в формате csv или ndjson"""
+    rows = export_rows(**filters)
+    if export_format == 'ndjson':
+        return ndjson_lines(rows)
+    return csv_lines(rows)
@@ -0,0 +1,77 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Sum
+
+from orders.models import Order, OrderItem
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет сохраненные итоги заказов (total_cost, items_count) пачками. '
+        'Можно прервать и продолжить с --start-after.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько заказов обновлять в одной транзакции',
+        )
+        parser.add_argument(
+            '--start-after', type=int, default=0,
+            help='Продолжить с заказа, следующего за указанным id',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Пауза между пачками в секундах',
+        )
+
+    def handle(self, *args, **options):
+        last_id = options['start_after']
+        processed = 0
+        started = time.monotonic()
+
+        while True:
+            ids = list(
+                Order.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not ids:
+                break
+
+            # Итоги всей пачки одним сгруппированным запросом
+            totals = {
+                row['order_id']: row
+                for row in OrderItem.objects.filter(order_id__in=ids)
+                .values('order_id')
+                .annotate(
+                    total_cost=Sum(F('price') * F('quantity')),
+                    items_count=Sum('quantity'),
+                )
+            }
+            orders = []
+            for order_id in ids:
+                row = totals.get(order_id, {})
+                orders.append(Order(
+                    id=order_id,
+                    total_cost=row.get('total_cost') or 0,
+                    items_count=row.get('items_count') or 0,
+                ))
+
+            with transaction.atomic():
+                Order.objects.bulk_update(orders, ['total_cost', 'items_count'])
+
+            processed += len(ids)
+            last_id = ids[-1]
+            self.stdout.write(
+                f'Обработано заказов: {processed}, последний id: {last_id} '
+                f'(продолжить: --start-after {last_id})'
+            )
+            time.sleep(options['pause'])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {processed} заказов за {elapsed:.1f} с'
+        ))
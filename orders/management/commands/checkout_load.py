@@ -0,0 +1,237 @@
+import json
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from core import db
+from core.testing import make_orders, make_products
+from orders.models import Order
+
+CHECKOUT_FORM = {
+    'first_name': 'Иван',
+    'last_name': 'Петров',
+    'phone': '+79000000000',
+    'address': 'ул. Ленина, 1',
+    'postal_code': '101000',
+    'city': 'Москва',
+}
+
+
+def _timed(timings, name, request, *args, **kwargs):
+    started = time.perf_counter()
+    response = request(*args, **kwargs)
+    timings.setdefault(name, []).append(time.perf_counter() - started)
+    return response
+
+
+def _shopper(number, slugs, ids, checkouts, items, seed):
+    """
+    Один покупатель: главная, страницы товаров, добавление в корзину
+    и оформление заказа, checkouts раз подряд.
+    """
+    rng = random.Random(seed)
+    client = Client()
+    timings = {}
+    failed = []
+    before = dict(db.lock_stats)
+    try:
+        for attempt in range(checkouts):
+            try:
+                _timed(timings, 'browse', client.get, reverse('products:home'))
+                for index in rng.sample(range(len(ids)), items):
+                    _timed(timings, 'browse', client.get,
+                           reverse('products:product_detail', args=[slugs[index]]))
+                    _timed(timings, 'cart_add', client.post,
+                           reverse('cart:cart_add', args=[ids[index]]))
+                _timed(timings, 'browse', client.get, reverse('orders:order_create'))
+                response = _timed(timings, 'checkout', client.post, reverse('orders:order_create'), dict(
+                    CHECKOUT_FORM, email=f'shopper{number}-{attempt}@example.com',
+                ))
+                if response.status_code != 302:
+                    failed.append(f'HTTP {response.status_code}')
+            except Exception as error:
+                failed.append(f'{type(error).__name__}: {error}')
+    finally:
+        connections.close_all()
+    # Разница счетчиков процесса верна, только если покупатель - отдельный
+    # процесс; для потоков счетчики снимаются один раз в _run()
+    return {
+        'timings': timings,
+        'failed': failed,
+        'lock': {name: db.lock_stats[name] - before[name] for name in before},
+    }
+
+
+def _percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+    cuts = statistics.quantiles(values, n=100, method='inclusive') if len(values) > 1 else values * 99
+    return {
+        'count': len(values),
+        'p50_ms': round(cuts[49] * 1000, 2),
+        'p95_ms': round(cuts[94] * 1000, 2),
+        'p99_ms': round(cuts[98] * 1000, 2),
+        'max_ms': round(values[-1] * 1000, 2),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон оформления заказов: наполняет временную БД каталогом '
+        'и историей заказов, запускает параллельных покупателей (тестовый клиент '
+        'Django) и выводит JSON с пропускной способностью, задержками '
+        '(p50/p95/p99), повторами из-за блокировок SQLite и неудачными заказами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--shoppers', type=int, default=8,
+            help='Сколько покупателей работают одновременно',
+        )
+        parser.add_argument(
+            '--checkouts', type=int, default=10,
+            help='Сколько заказов оформляет каждый покупатель',
+        )
+        parser.add_argument(
+            '--items', type=int, default=3,
+            help='Сколько разных товаров покупатель кладет в корзину',
+        )
+        parser.add_argument(
+            '--products', type=int, default=500,
+            help='Размер каталога',
+        )
+        parser.add_argument(
+            '--history', type=int, default=2000,
+            help='Сколько старых заказов создать до прогона',
+        )
+        parser.add_argument(
+            '--processes', action='store_true',
+            help='Покупатели - отдельные процессы, а не потоки',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Начальное значение генератора случайных чисел',
+        )
+        parser.add_argument(
+            '--output',
+            help='Записать результат в файл JSON (для сравнения между коммитами)',
+        )
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = dict(settings.CACHES['default'], LOCATION=Path(directory) / 'cache.sqlite3')
+            with override_settings(CACHES={'default': cache}):
+                self._use_database(Path(directory) / 'db.sqlite3')
+                setup_test_environment(debug=False)
+                try:
+                    result = self._run(options)
+                finally:
+                    teardown_test_environment()
+                    connections.close_all()
+
+        report = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            Path(options['output']).write_text(report + '\n', encoding='utf-8')
+        self.stdout.write(report)
+
+    def _use_database(self, path):
+        # Как при создании тестовой БД: все соединения, в том числе
+        # в потоках покупателей, открываются к временному файлу
+        connections.close_all()
+        connection.settings_dict['NAME'] = path
+        call_command('migrate', verbosity=0)
+
+    def _run(self, options):
+        products = make_products(options['products'])
+        make_orders(products, options['history'])
+        slugs = [product.slug for product in products]
+        ids = [product.pk for product in products]
+        items = min(options['items'], len(ids))
+
+        shoppers = options['shoppers']
+        if options['processes']:
+            connections.close_all()
+            executor = ProcessPoolExecutor(shoppers, mp_context=get_context('fork'))
+        else:
+            executor = ThreadPoolExecutor(shoppers)
+
+        before = dict(db.lock_stats)
+        started = time.perf_counter()
+        with executor:
+            results = list(executor.map(
+                _shopper,
+                range(shoppers),
+                [slugs] * shoppers,
+                [ids] * shoppers,
+                [options['checkouts']] * shoppers,
+                [items] * shoppers,
+                [options['seed'] + number for number in range(shoppers)],
+            ))
+        elapsed = time.perf_counter() - started
+
+        timings = {}
+        for result in results:
+            for name, values in result['timings'].items():
+                timings.setdefault(name, []).extend(values)
+        failed = [error for result in results for error in result['failed']]
+        attempted = shoppers * options['checkouts']
+        requests = sum(len(values) for values in timings.values())
+
+        return {
+            'commit': _git_commit(),
+            'config': {
+                'shoppers': shoppers,
+                'checkouts_per_shopper': options['checkouts'],
+                'items_per_checkout': items,
+                'products': options['products'],
+                'workers': 'processes' if options['processes'] else 'threads',
+                'sqlite_tuning': settings.SQLITE_TUNING,
+                'transaction_mode': connection.settings_dict['OPTIONS'].get('transaction_mode', 'DEFERRED'),
+                'lock_retries': settings.DB_LOCK_RETRIES,
+            },
+            'elapsed_s': round(elapsed, 3),
+            'throughput': {
+                'checkouts_per_s': round((attempted - len(failed)) / elapsed, 2),
+                'requests_per_s': round(requests / elapsed, 2),
+            },
+            'latency': {name: _percentiles(values) for name, values in sorted(timings.items())},
+            'checkouts': {
+                'attempted': attempted,
+                'succeeded': attempted - len(failed),
+                'failed': len(failed),
+                # Сверка: сколько заказов действительно появилось в БД
+                'orders_created': Order.objects.count() - options['history'],
+                'errors': sorted(set(failed)),
+            },
+            'lock': {
+                name: (
+                    sum(result['lock'][name] for result in results)
+                    if options['processes'] else db.lock_stats[name] - before[name]
+                )
+                for name in before
+            },
+        }
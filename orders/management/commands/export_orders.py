@@ -0,0 +1,45 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from orders.export import FORMATS, export_lines
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка заказов с позициями в CSV или NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(FORMATS), default='csv')
+        parser.add_argument('--date-from', help='Начало периода, ГГГГ-ММ-ДД')
+        parser.add_argument('--date-to', help='Конец периода (включительно), ГГГГ-ММ-ДД')
+        parser.add_argument('--status', choices=[value for value, _ in Order.STATUS_CHOICES])
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--output', help='Файл для выгрузки (по умолчанию stdout)')
+
+    def _date(self, value):
+        if not value:
+            return None
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise CommandError(f'Некорректная дата: {value}')
+        return day
+
+    def handle(self, *args, **options):
+        lines = export_lines(
+            options['format'],
+            date_from=self._date(options['date_from']),
+            date_to=self._date(options['date_to']),
+            status=options['status'],
+            chunk_size=options['chunk_size'],
+        )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(lines)
+        else:
+            sys.stdout.writelines(lines)
@@ -0,0 +1,63 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from orders.models import Order
+from orders.rollup import rebuild_range
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает сводку продаж по дням (DailyProductSales) по истории заказов. '
+        'Каждая пачка дней пересчитывается в отдельной транзакции.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Пересчитать начиная с даты ГГГГ-ММ-ДД (по умолчанию - с первого заказа)',
+        )
+        parser.add_argument(
+            '--days-per-batch', type=int, default=31,
+            help='Сколько дней пересчитывать в одной транзакции',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Пауза между пачками в секундах',
+        )
+
+    def handle(self, *args, **options):
+        if options['since']:
+            try:
+                start = parse_date(options['since'])
+            except ValueError:
+                start = None
+            if start is None:
+                raise CommandError(f'Некорректная дата: {options["since"]}')
+        else:
+            first = Order.objects.aggregate(first=Min('created'))['first']
+            if first is None:
+                self.stdout.write('Заказов нет, пересчитывать нечего')
+                return
+            start = timezone.localdate(first)
+
+        end = timezone.localdate() + timedelta(days=1)
+        step = timedelta(days=options['days_per_batch'])
+        rows = 0
+        started = time.monotonic()
+
+        while start < end:
+            batch_end = min(start + step, end)
+            rows += rebuild_range(start, batch_end)
+            self.stdout.write(f'{start} - {batch_end - timedelta(days=1)}: строк сводки {rows}')
+            start = batch_end
+            time.sleep(options['pause'])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {rows} строк сводки за {elapsed:.1f} с'
+        ))
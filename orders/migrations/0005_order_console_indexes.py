@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_totals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='email',
+            field=models.EmailField(db_index=True, max_length=254, verbose_name='Email'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='last_name',
+            field=models.CharField(db_index=True, max_length=50, verbose_name='Фамилия'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='phone',
+            field=models.CharField(db_index=True, null=True, verbose_name='Email'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-created', '-id'], name='order_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', '-created', '-id'], name='order_status_created_idx'),
+        ),
+    ]
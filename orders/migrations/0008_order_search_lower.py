@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:46
+
+import orders.models
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def fill_lower(apps, schema_editor):
+    # Регистр меняем в Python: lower() в SQLite не знает кириллицы
+    Order = apps.get_model('orders', 'Order')
+    last_id = 0
+    while True:
+        orders = list(
+            Order.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .only('id', 'last_name', 'email')[:BATCH_SIZE]
+        )
+        if not orders:
+            break
+        for order in orders:
+            order.last_name_lower = order.last_name.lower()
+            order.email_lower = order.email.lower()
+        Order.objects.bulk_update(orders, ['last_name_lower', 'email_lower'])
+        last_id = orders[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_orderitem_order_product_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='email_lower',
+            field=orders.models.LowercaseField(db_index=True, default='', editable=False, max_length=254, source='email'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='last_name_lower',
+            field=orders.models.LowercaseField(db_index=True, default='', editable=False, max_length=50, source='last_name'),
+        ),
+        migrations.RunPython(fill_lower, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='order',
+            name='email',
+            field=models.EmailField(max_length=254, verbose_name='Email'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='last_name',
+            field=models.CharField(max_length=50, verbose_name='Фамилия'),
+        ),
+    ]
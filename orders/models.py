@@ -2,6 +2,30 @@ from django.db import models
 from products.models import Product
 from django.contrib.auth.models import User
 
+class LowercaseField(models.CharField):
+    """
+    Копия текстового поля source в нижнем регистре для поиска без учета регистра.
+
+    Заполняется в Python при каждом сохранении, в том числе через bulk_create:
+    lower() в SQLite меняет регистр только латинских букв. update() и
+    bulk_update поле не пересчитывают - его нужно передавать явно.
+    """
+
+    def __init__(self, *args, source, **kwargs):
+        self.source = source
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['source'] = self.source
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = (getattr(model_instance, self.source) or '').lower()
+        setattr(model_instance, self.attname, value)
+        return value
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Ожидает обработки'),
@@ -23,24 +47,56 @@ class Order(models.Model):
     first_name = models.CharField(max_length=50, verbose_name='Имя')
     last_name = models.CharField(max_length=50, verbose_name='Фамилия')
     email = models.EmailField(verbose_name='Email')
-    phone = models.CharField(verbose_name='Email', null=True)
+    # Фамилия и email в нижнем регистре: по ним ищут заказы в админ-панели
+    last_name_lower = LowercaseField(max_length=50, source='last_name', default='', editable=False, db_index=True)
+    email_lower = LowercaseField(max_length=254, source='email', default='', editable=False, db_index=True)
+    phone = models.CharField(verbose_name='Email', null=True, db_index=True)
     address = models.CharField(max_length=250, verbose_name='Адрес')
     postal_code = models.CharField(max_length=20, verbose_name='Почтовый индекс')
     city = models.CharField(max_length=100, verbose_name='Город')
     created = models.DateTimeField(auto_now_add=True, verbose_name='Создан')
     updated = models.DateTimeField(auto_now=True, verbose_name='Обновлен')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='Статус')
+    # Итоги хранятся в заказе, чтобы списки заказов не пересчитывали строки
+    total_cost = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='Сумма')
+    items_count = models.PositiveIntegerField(default=0, verbose_name='Количество товаров')
     
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = 'Заказы'
         ordering = ['-created']
+        indexes = [
+            # Лента заказов в админ-панели и фильтр по статусу (keyset по -created, -id)
+            models.Index(fields=['-created', '-id'], name='order_created_idx'),
+            models.Index(fields=['status', '-created', '-id'], name='order_status_created_idx'),
+        ]
     
     def __str__(self):
         return f'Order {self.id}'
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Статус на момент загрузки: по нему сигналы понимают, что заказ отменили
+        # или вернули из отмены, и пересчитывают сводку продаж
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
     
     def get_total_cost(self):
-        return sum(item.get_cost() for item in self.items.all())
+        return self.total_cost
+
+    def update_totals(self):
+        """Пересчитывает сохраненные итоги заказа по его строкам"""
+        totals = OrderItem.objects.filter(order_id=self.pk).aggregate(
+            total_cost=models.Sum(models.F('price') * models.F('quantity')),
+            items_count=models.Sum('quantity'),
+        )
+        self.total_cost = totals['total_cost'] or 0
+        self.items_count = totals['items_count'] or 0
+        Order.objects.filter(pk=self.pk).update(
+            total_cost=self.total_cost,
+            items_count=self.items_count,
+        )
     
 
     def get_status_badge_class(self):
@@ -63,9 +119,36 @@ class OrderItem(models.Model):
     class Meta:
         verbose_name = 'Элемент заказа'
         verbose_name_plural = 'Элементы заказа'
+        indexes = [
+            # Строки заказа и поиск конкретного товара в заказе
+            models.Index(fields=['order', 'product'], name='orderitem_order_product_idx'),
+        ]
     
     def __str__(self):
         return str(self.id)
     
     def get_cost(self):
-        return self.price * self.quantity
\ No newline at end of file
+        return self.price * self.quantity
+
+
+class DailyProductSales(models.Model):
+    """
+    Продажи товара за день (по местной дате заказа).
+
+    Сводная таблица для статистики: отчет за год читает не больше
+    365 строк на товар вместо всех строк заказов. Отмененные заказы
+    не учитываются. Поддерживается модулем orders.rollup.
+    """
+    date = models.DateField(verbose_name='Дата')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales', verbose_name='Товар')
+    quantity = models.PositiveIntegerField(default=0, verbose_name='Продано, шт.')
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='Выручка')
+    orders = models.PositiveIntegerField(default=0, verbose_name='Заказов')
+
+    class Meta:
+        verbose_name = 'Продажи товара за день'
+        verbose_name_plural = 'Продажи товаров по дням'
+        unique_together = ['date', 'product']
+
+    def __str__(self):
+        return f'{self.date} {self.product_id}'
\ No newline at end of file
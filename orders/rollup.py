@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from core.dates import day_start
+from .models import DailyProductSales, OrderItem
+
+# Отмененные заказы в сводку продаж не попадают
+EXCLUDED_STATUSES = ['cancelled']
+
+
+def record_order(order, items):
+    """
+    Добавляет строки нового заказа в сводку за его день.
+
+    Один оператор INSERT ... ON CONFLICT на товар: параллельные заказы
+    за тот же день складываются, а не перезаписывают друг друга.
+    """
+    if order.status in EXCLUDED_STATUSES or not items:
+        return
+    ops = connection.ops
+    day = ops.adapt_datefield_value(timezone.localdate(order.created))
+    table = DailyProductSales._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {table} (date, product_id, quantity, revenue, orders) '
+            'VALUES (%s, %s, %s, %s, 1) '
+            'ON CONFLICT (date, product_id) DO UPDATE SET '
+            'quantity = quantity + excluded.quantity, '
+            'revenue = revenue + excluded.revenue, '
+            'orders = orders + 1',
+            [
+                (day, item.product_id, item.quantity,
+                 ops.adapt_decimalfield_value(item.price * item.quantity))
+                for item in items
+            ],
+        )
+
+
+def _sales_rows(items):
+    """Строки заказов, сгруппированные по местной дате и товару"""
+    return (
+        items.exclude(order__status__in=EXCLUDED_STATUSES)
+        .annotate(day=TruncDate('order__created', tzinfo=timezone.get_current_timezone()))
+        .values('day', 'product_id')
+        .annotate(
+            total_quantity=Sum('quantity'),
+            total_revenue=Sum(F('quantity') * F('price')),
+            total_orders=Count('order_id', distinct=True),
+        )
+        .order_by()
+    )
+
+
+def rebuild_range(start_day, end_day):
+    """
+    Пересчитывает сводку за дни [start_day, end_day) по строкам заказов.
+
+    Используется при изменении уже оформленного заказа (отмена, правка
+    строк в админке) и командой rebuild_daily_sales.
+    """
+    items = OrderItem.objects.filter(
+        order__created__gte=day_start(start_day),
+        order__created__lt=day_start(end_day),
+    )
+    with transaction.atomic():
+        DailyProductSales.objects.filter(date__gte=start_day, date__lt=end_day).delete()
+        rows = DailyProductSales.objects.bulk_create([
+            DailyProductSales(
+                date=row['day'],
+                product_id=row['product_id'],
+                quantity=row['total_quantity'],
+                revenue=row['total_revenue'],
+                orders=row['total_orders'],
+            )
+            for row in _sales_rows(items)
+        ])
+    return len(rows)
+
+
+def refresh_order_day(order):
+    """Пересчитывает сводку за день заказа"""
+    day = timezone.localdate(order.created)
+    return rebuild_range(day, day + timedelta(days=1))
@@ -0,0 +1,102 @@
+import random
+import string
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from core.db import retry_on_lock
+from .models import Order, OrderItem
+from .rollup import record_order
+
+
+def _generate_username(email, first_name, last_name):
+    """Генерация уникального имени пользователя на основе email и имени"""
+    base_username = f"{first_name.lower()}_{last_name.lower()}"
+    username = base_username
+    
+    # Если username уже существует, добавляем случайные цифры
+    counter = 1
+    while User.objects.filter(username=username).exists():
+        username = f"{base_username}_{counter}"
+        counter += 1
+    
+    return username
+
+def _generate_random_password(length=12):
+    """Генерация случайного пароля"""
+    characters = string.ascii_letters + string.digits + "!@#$%^&*"
+    return ''.join(random.choice(characters) for i in range(length))
+
+
+@retry_on_lock
+def checkout(cart, summary, user=None, create_account=False, **order_data):
+    """
+    Оформляет заказ, при create_account - вместе с учетной записью покупателя.
+
+    Учетная запись и заказ создаются в одной транзакции, и при блокировке
+    записи повторяется вся транзакция. Если у покупателя с этим email уже
+    есть учетная запись, заказ привязывается к ней.
+    Возвращает (заказ, пользователь, пароль); пароль - только у новой учетной записи.
+    """
+    password = None
+    if create_account and user is None:
+        # Хэш пароля считаем до транзакции: это долго, а транзакция
+        # с начала держит блокировку записи
+        password = _generate_random_password()
+        encoded = make_password(password)
+
+    with transaction.atomic():
+        if password:
+            user = User.objects.filter(email=order_data['email']).first()
+            if user is None:
+                user = User.objects.create(
+                    username=_generate_username(
+                        order_data['email'], order_data['first_name'], order_data['last_name'],
+                    ),
+                    email=order_data['email'],
+                    password=encoded,
+                    first_name=order_data['first_name'],
+                    last_name=order_data['last_name'],
+                )
+            else:
+                password = None
+        order = place_order(cart, summary, user=user, **order_data)
+    return order, user, password
+
+
+@retry_on_lock
+def place_order(cart, summary, user=None, **order_data):
+    """
+    Оформляет заказ из содержимого корзины.
+
+    summary - уже загруженное содержимое корзины (cart.get_summary()),
+    цены товаров фиксируются из него. Число запросов не зависит от
+    размера корзины: заказ, один bulk_create строк, пополнение сводки
+    продаж и очистка корзины.
+    Транзакция охватывает только запись; если блокировку записи SQLite
+    получить не удалось, заказ оформляется заново (retry_on_lock).
+    """
+    # Итоги заказа считаем сразу по снимку корзины:
+    # bulk_create не вызывает сигналы, пересчитывающие их.
+    # Внутри checkout() отдельная точка сохранения не нужна:
+    # при ошибке откатывается вся транзакция
+    with transaction.atomic(savepoint=False):
+        order = Order.objects.create(
+            user=user,
+            total_cost=summary.total_price,
+            items_count=summary.total_quantity,
+            **order_data
+        )
+        items = OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=item.product,
+                price=item.product.price,
+                quantity=item.quantity,
+            )
+            for item in summary.items
+        ])
+        record_order(order, items)
+        cart.clear()
+    return order
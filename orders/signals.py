@@ -0,0 +1,41 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Order, OrderItem
+from .rollup import EXCLUDED_STATUSES, refresh_order_day
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created=False, raw=False, **kwargs):
+    # Новый заказ попадает в сводку вместе со строками (orders.services),
+    # здесь обрабатываем только отмену и возврат из отмены
+    if created or raw:
+        return
+    previous = getattr(instance, '_loaded_status', None)
+    if previous is None or (previous in EXCLUDED_STATUSES) != (instance.status in EXCLUDED_STATUSES):
+        refresh_order_day(instance)
+    instance._loaded_status = instance.status
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    refresh_order_day(instance)
+
+
+@receiver(post_save, sender=OrderItem)
+def order_item_saved(sender, instance, raw=False, **kwargs):
+    # Строки заказа изменили (например, в админке) - пересчитываем итоги
+    if not raw:
+        instance.order.update_totals()
+        refresh_order_day(instance.order)
+
+
+@receiver(post_delete, sender=OrderItem)
+def order_item_deleted(sender, instance, origin=None, **kwargs):
+    # При удалении самого заказа пересчитывать нечего
+    if isinstance(origin, Order) or getattr(origin, 'model', None) is Order:
+        return
+    order = Order.objects.filter(pk=instance.order_id).first()
+    if order is not None:
+        order.update_totals()
+        refresh_order_day(order)
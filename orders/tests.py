@@ -1,3 +1,254 @@
-from django.test import TestCase
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.db import lock_stats
+from core.testing import QueryPlanMixin, analyze, make_orders, make_products, sqlite_only
+from .export import export_rows
+from .models import DailyProductSales, Order, OrderItem
+from .rollup import refresh_order_day
+
+
+@sqlite_only
+class OrderQueryPlanTests(QueryPlanMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = make_products(30)
+        cls.orders = make_orders(cls.products, 400)
+        analyze()
+
+    def test_export_period(self):
+        today = timezone.localdate()
+        with self.assertNoFullScans():
+            list(export_rows(date_from=today - timedelta(days=7), date_to=today))
+            list(export_rows(date_from=today - timedelta(days=30), status='pending'))
+
+    def test_rollup_refresh_day(self):
+        with self.assertNoFullScans():
+            refresh_order_day(self.orders[10])
+
+    def test_order_item_lookup(self):
+        item = OrderItem.objects.first()
+        self.assertNoFullScan(
+            OrderItem.objects.filter(order_id=item.order_id, product_id=item.product_id)
+        )
+
+
+CHECKOUT_FORM = {
+    'first_name': 'Иван',
+    'last_name': 'Петров',
+    'email': 'ivan@example.com',
+    'phone': '+79000000000',
+    'address': 'ул. Ленина, 1',
+    'postal_code': '101000',
+    'city': 'Москва',
+}
+
+
+class CheckoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = make_products(3)
+
+    def fill_cart(self):
+        for product in self.products[:2]:
+            self.client.post(reverse('cart:cart_add', args=[product.pk]))
+        self.client.post(reverse('cart:cart_add', args=[self.products[0].pk]))
+
+    def test_order_totals(self):
+        self.fill_cart()
+        response = self.client.post(reverse('orders:order_create'), CHECKOUT_FORM)
+        order = Order.objects.get()
+        self.assertRedirects(response, reverse('orders:order_created', args=[order.pk]))
+        # Товар 0 (100 руб.) дважды, товар 1 (101 руб.) один раз
+        self.assertEqual(order.total_cost, Decimal('301.00'))
+        self.assertEqual(order.items_count, 3)
+        self.assertEqual(
+            sorted(order.items.values_list('product_id', 'price', 'quantity')),
+            [(self.products[0].pk, Decimal('100.00'), 2), (self.products[1].pk, Decimal('101.00'), 1)],
+        )
+        self.assertEqual(
+            DailyProductSales.objects.get(product=self.products[0]).quantity, 2,
+        )
+        # Корзина очищена
+        response = self.client.get(reverse('orders:order_create'))
+        self.assertRedirects(response, reverse('cart:cart_detail'))
+
+    def test_queries_do_not_grow_with_cart(self):
+        counts = []
+        for size in [1, 3]:
+            for product in self.products[:size]:
+                self.client.post(reverse('cart:cart_add', args=[product.pk]))
+            with CaptureQueriesContext(connection) as context:
+                self.client.post(reverse('orders:order_create'), CHECKOUT_FORM)
+            counts.append(len(context))
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(counts[0], counts[1])
+
+    def test_account_created_with_order(self):
+        self.fill_cart()
+        self.client.post(reverse('orders:order_create'), dict(CHECKOUT_FORM, create_account='on'))
+        user = User.objects.get(email=CHECKOUT_FORM['email'])
+        self.assertEqual(Order.objects.get().user, user)
+        self.assertEqual(int(self.client.session['_auth_user_id']), user.pk)
+
+    def test_existing_account_is_reused(self):
+        user = User.objects.create_user('ivan', CHECKOUT_FORM['email'])
+        self.fill_cart()
+        self.client.post(reverse('orders:order_create'), dict(CHECKOUT_FORM, create_account='on'))
+        self.assertEqual(User.objects.count(), 1)
+        self.assertEqual(Order.objects.get().user, user)
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_failed_order_leaves_no_account(self):
+        self.fill_cart()
+        with mock.patch('orders.services.place_order', side_effect=RuntimeError('сбой')):
+            with self.assertRaises(RuntimeError):
+                self.client.post(reverse('orders:order_create'), dict(CHECKOUT_FORM, create_account='on'))
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Order.objects.exists())
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+
+class OrderTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = make_products(4)
+        cls.orders = make_orders(cls.products, 12)
+
+    def expected(self):
+        return {
+            order.pk: (
+                sum((item.price * item.quantity for item in order.items.all()), Decimal('0')),
+                sum(item.quantity for item in order.items.all()),
+            )
+            for order in Order.objects.prefetch_related('items')
+        }
+
+    def stored(self):
+        return {pk: (total, count) for pk, total, count in Order.objects.values_list('pk', 'total_cost', 'items_count')}
+
+    def test_backfill(self):
+        expected = self.expected()
+        self.assertEqual(self.stored(), expected)
+        Order.objects.update(total_cost=0, items_count=0)
+        Order.objects.create(
+            first_name='Иван', last_name='Петров', email='empty@example.com',
+            address='ул. Ленина, 1', postal_code='101000', city='Москва', total_cost=5,
+        )
+        call_command('backfill_order_totals', '--batch-size', '5', stdout=StringIO())
+        stored = self.stored()
+        self.assertEqual(stored.pop(Order.objects.get(email='empty@example.com').pk), (0, 0))
+        self.assertEqual(stored, expected)
+
+    def test_backfill_resumes_after_id(self):
+        Order.objects.update(total_cost=0, items_count=0)
+        middle = self.orders[5].pk
+        call_command('backfill_order_totals', '--start-after', str(middle), stdout=StringIO())
+        filled = Order.objects.filter(items_count__gt=0).values_list('pk', flat=True)
+        self.assertEqual(sorted(filled), sorted(order.pk for order in self.orders if order.pk > middle))
+
+    def test_item_changes_update_totals(self):
+        order = self.orders[0]
+        item = order.items.first()
+        item.quantity += 2
+        item.save()
+        OrderItem.objects.create(order=order, product=self.products[3], price=Decimal('7.50'), quantity=2)
+        order.items.exclude(pk=item.pk).exclude(price=Decimal('7.50')).delete()
+        self.assertEqual(self.stored()[order.pk], self.expected()[order.pk])
+
+
+class DailySalesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = make_products(5)
+        cls.orders = make_orders(cls.products, 80, days=20)
+
+    def raw(self):
+        """Сводка, посчитанная напрямую по строкам заказов"""
+        sales = defaultdict(lambda: [0, Decimal('0'), set()])
+        items = OrderItem.objects.select_related('order').exclude(order__status='cancelled')
+        for item in items:
+            row = sales[timezone.localdate(item.order.created), item.product_id]
+            row[0] += item.quantity
+            row[1] += item.price * item.quantity
+            row[2].add(item.order_id)
+        return {key: (quantity, revenue, len(orders)) for key, (quantity, revenue, orders) in sales.items()}
+
+    def rollup(self):
+        return {
+            (row.date, row.product_id): (row.quantity, row.revenue, row.orders)
+            for row in DailyProductSales.objects.all()
+        }
+
+    def test_rebuild_matches_raw(self):
+        self.assertEqual(self.rollup(), self.raw())
+        DailyProductSales.objects.all().delete()
+        call_command('rebuild_daily_sales', '--days-per-batch', '3', stdout=StringIO())
+        self.assertEqual(self.rollup(), self.raw())
+
+    def test_incremental_updates_match_raw(self):
+        for product in self.products[:2]:
+            self.client.post(reverse('cart:cart_add', args=[product.pk]))
+        self.client.post(reverse('orders:order_create'), CHECKOUT_FORM)
+        self.assertEqual(self.rollup(), self.raw())
+
+        order = next(order for order in self.orders if order.status != 'cancelled')
+        order = Order.objects.get(pk=order.pk)
+        order.status = 'cancelled'
+        order.save()
+        self.assertEqual(self.rollup(), self.raw())
+        order.status = 'delivered'
+        order.save()
+        self.assertEqual(self.rollup(), self.raw())
+
+        order.items.first().delete()
+        self.assertEqual(self.rollup(), self.raw())
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    shoppers = 8
+
+    def test_concurrent_checkouts_succeed(self):
+        products = make_products(3)
+        barrier = threading.Barrier(self.shoppers)
+        statuses = []
+        errors = []
+
+        def checkout(number):
+            client = Client()
+            try:
+                client.post(reverse('cart:cart_add', args=[products[number % 3].pk]))
+                barrier.wait()
+                response = client.post(
+                    reverse('orders:order_create'),
+                    dict(CHECKOUT_FORM, email=f'buyer{number}@example.com'),
+                )
+                statuses.append(response.status_code)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        failures = lock_stats['failures']
+        threads = [threading.Thread(target=checkout, args=(i,)) for i in range(self.shoppers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(statuses, [302] * self.shoppers)
+        self.assertEqual(Order.objects.count(), self.shoppers)
+        self.assertEqual(lock_stats['failures'], failures)
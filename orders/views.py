@@ -1,45 +1,16 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.contrib.auth import login, authenticate
-from django.contrib.auth.models import User
+from django.contrib.auth import login
 from django.contrib import messages
-from django.db import transaction
-import random
-import string
-from .models import Order, OrderItem
-from cart.models import Cart, CartItem
+from .models import Order
+from .services import checkout
+from cart.backends import get_cart
 from .forms import OrderForm, CustomUserCreationForm
 
-def _get_cart(request):
-    """Вспомогательная функция для получения корзины"""
-    if not request.session.session_key:
-        request.session.create()
-    
-    cart, created = Cart.objects.get_or_create(session_key=request.session.session_key)
-    return cart
-
-def _generate_username(email, first_name, last_name):
-    """Генерация уникального имени пользователя на основе email и имени"""
-    base_username = f"{first_name.lower()}_{last_name.lower()}"
-    username = base_username
-    
-    # Если username уже существует, добавляем случайные цифры
-    counter = 1
-    while User.objects.filter(username=username).exists():
-        username = f"{base_username}_{counter}"
-        counter += 1
-    
-    return username
-
-def _generate_random_password(length=12):
-    """Генерация случайного пароля"""
-    characters = string.ascii_letters + string.digits + "!@#$%^&*"
-    return ''.join(random.choice(characters) for i in range(length))
-
-@transaction.atomic
 def order_create(request):
-    cart = _get_cart(request)
+    cart = get_cart(request)
+    summary = cart.get_summary()
     
-    if not cart.items.exists():
+    if not summary:
         messages.error(request, 'Ваша корзина пуста')
         return redirect('cart:cart_detail')
     
@@ -57,46 +28,14 @@ def order_create(request):
             city = form.cleaned_data['city']
             create_account = form.cleaned_data['create_account']
             
-            user = None
-            
-            # Создаем пользователя, если отмечена галочка и пользователь не авторизован
-            if create_account and not request.user.is_authenticated:
-                try:
-                    # Проверяем, существует ли пользователь с таким email
-                    existing_user = User.objects.filter(email=email).first()
-                    
-                    if existing_user:
-                        # Пользователь уже существует, используем его
-                        user = existing_user
-                        messages.info(request, f'Найден существующий аккаунт с email {email}. Вы можете войти в него.')
-                    else:
-                        # Создаем нового пользователя
-                        username = _generate_username(email, first_name, last_name)
-                        password = _generate_random_password()
-                        
-                        user = User.objects.create_user(
-                            username=username,
-                            email=email,
-                            password=password,
-                            first_name=first_name,
-                            last_name=last_name
-                        )
-                        
-                        # Авторизуем пользователя
-                        auth_user = authenticate(request, username=username, password=password)
-                        if auth_user:
-                            login(request, auth_user)
-                            messages.success(request, f'Аккаунт создан! Ваш логин: {username}')
-                except Exception as e:
-                    messages.warning(request, f'Не удалось создать аккаунт: {str(e)}')
-            
-            # Если пользователь уже авторизован, используем его
-            elif request.user.is_authenticated:
-                user = request.user
-            
-            # Создание заказа
-            order = Order.objects.create(
+            # Учетная запись (если отмечена галочка) и заказ создаются
+            # в одной транзакции: при ошибке не остается ни того, ни другого
+            user = request.user if request.user.is_authenticated else None
+            order, user, password = checkout(
+                cart,
+                summary,
                 user=user,
+                create_account=create_account,
                 first_name=first_name,
                 last_name=last_name,
                 email=email,
@@ -106,17 +45,13 @@ def order_create(request):
                 city=city
             )
             
-            # Перенос товаров из корзины в заказ
-            for cart_item in cart.items.all():
-                OrderItem.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    price=cart_item.product.price,
-                    quantity=cart_item.quantity
-                )
-            
-            # Очистка корзины
-            cart.items.all().delete()
+            if password:
+                # Авторизуем нового пользователя
+                login(request, user, backend='django.contrib.auth.backends.ModelBackend')
+                messages.success(request, f'Аккаунт создан! Ваш логин: {user.username}')
+            elif create_account and user and not request.user.is_authenticated:
+                # Пользователь с таким email уже существует, заказ привязан к нему
+                messages.info(request, f'Найден существующий аккаунт с email {email}. Вы можете войти в него.')
             
             messages.success(request, 'Ваш заказ успешно создан!')
             return redirect('orders:order_created', order_id=order.id)
@@ -134,7 +69,7 @@ def order_create(request):
         form = OrderForm(initial=initial_data)
     
     context = {
-        'cart': cart,
+        'summary': summary,
         'form': form,
     }
     return render(request, 'orders/create.html', context)
@@ -165,7 +100,8 @@ def order_list(request):
     return render(request, 'orders/list.html', context)
 
 def order_detail(request, order_id):
-    order = get_object_or_404(Order, id=order_id)
+    # Строки заказа и их товары - двумя запросами, а не по запросу на строку
+    order = get_object_or_404(Order.objects.prefetch_related('items__product'), id=order_id)
     
     # Проверяем права доступа
     if not request.user.is_authenticated or (order.user != request.user and not request.user.is_staff):
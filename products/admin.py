@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Product
+from .models import ImageJob, Product
 
  
 
@@ -10,4 +10,12 @@ class ProductAdmin(admin.ModelAdmin):
     list_editable = ['price', 'is_available']
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name', 'description']
-    date_hierarchy = 'created_at'
\ No newline at end of file
+    date_hierarchy = 'created_at'
+
+
+@admin.register(ImageJob)
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = ['product', 'status', 'attempts', 'run_after', 'updated']
+    list_filter = ['status']
+    raw_id_fields = ['product']
+    readonly_fields = ['attempts', 'locked_at', 'last_error', 'created', 'updated']
@@ -0,0 +1,147 @@
+import copy
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Product
+from .version import catalog_version
+
+
+class ProductCache:
+    """
+    Кэш объектов Product по id и slug.
+
+    Первый уровень - LRU в памяти процесса (не больше size товаров),
+    второй, необязательный - общий кэш Django (настройка PRODUCT_CACHE_SHARED).
+    Записи привязаны к версии каталога (products.version): после
+    изменения любого товара в любом процессе локальный кэш очищается,
+    а ключи общего кэша перестают совпадать.
+    """
+
+    def __init__(self, size, shared_alias=None):
+        self.size = size
+        self.shared_alias = shared_alias
+        self._lock = threading.Lock()
+        self._products = OrderedDict()
+        self._slugs = {}
+        self._version = None
+        self.stats = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _check_version(self):
+        version = catalog_version()
+        if version != self._version:
+            self._products.clear()
+            self._slugs.clear()
+            self._version = version
+        return version
+
+    def _shared(self):
+        return caches[self.shared_alias] if self.shared_alias else None
+
+    def _shared_key(self, version, pk):
+        return f'products:object:{version}:{pk}'
+
+    def _remember(self, product):
+        self._products[product.pk] = product
+        self._products.move_to_end(product.pk)
+        self._slugs[product.slug] = product.pk
+        while len(self._products) > self.size:
+            _, evicted = self._products.popitem(last=False)
+            self._slugs.pop(evicted.slug, None)
+            self.stats['evictions'] += 1
+
+    def get(self, pk=None, slug=None):
+        """Товар по id или slug (копия объекта) или None"""
+        with self._lock:
+            version = self._check_version()
+            if slug is not None:
+                pk = self._slugs.get(slug, pk)
+            product = self._products.get(pk)
+            if product is not None:
+                self._products.move_to_end(pk)
+                self.stats['hits'] += 1
+                return copy.copy(product)
+
+        shared = self._shared()
+        if shared is not None and pk is not None:
+            product = shared.get(self._shared_key(version, pk))
+            if product is not None and (slug is None or product.slug == slug):
+                with self._lock:
+                    self.stats['shared_hits'] += 1
+                    self._remember(product)
+                return copy.copy(product)
+
+        lookup = {'slug': slug} if slug is not None else {'pk': pk}
+        product = Product.objects.filter(**lookup).first()
+        with self._lock:
+            self.stats['misses'] += 1
+            if product is not None and version == self._version:
+                self._remember(product)
+        if product is not None and shared is not None:
+            shared.set(self._shared_key(version, product.pk), product, settings.PRODUCT_CACHE_TIMEOUT)
+        return copy.copy(product) if product is not None else None
+
+    def get_many(self, pks):
+        """Словарь {id: товар}; недостающие товары загружаются одним запросом"""
+        found = {}
+        with self._lock:
+            version = self._check_version()
+            for pk in pks:
+                product = self._products.get(pk)
+                if product is not None:
+                    self._products.move_to_end(pk)
+                    found[pk] = copy.copy(product)
+            self.stats['hits'] += len(found)
+
+        missing = [pk for pk in pks if pk not in found]
+        shared = self._shared()
+        if missing and shared is not None:
+            keys = {self._shared_key(version, pk): pk for pk in missing}
+            for key, product in shared.get_many(list(keys)).items():
+                found[keys[key]] = copy.copy(product)
+            with self._lock:
+                for pk in missing:
+                    if pk in found:
+                        self.stats['shared_hits'] += 1
+                        self._remember(found[pk])
+            missing = [pk for pk in missing if pk not in found]
+
+        if missing:
+            loaded = Product.objects.in_bulk(missing)
+            with self._lock:
+                self.stats['misses'] += len(missing)
+                if version == self._version:
+                    for product in loaded.values():
+                        self._remember(product)
+            if shared is not None:
+                shared.set_many(
+                    {self._shared_key(version, pk): product for pk, product in loaded.items()},
+                    settings.PRODUCT_CACHE_TIMEOUT,
+                )
+            found.update({pk: copy.copy(product) for pk, product in loaded.items()})
+        return found
+
+    def invalidate(self, pk):
+        """Убирает товар из кэша процесса (вызывается сигналами Product)"""
+        with self._lock:
+            product = self._products.pop(pk, None)
+            if product is not None:
+                self._slugs.pop(product.slug, None)
+
+    def clear(self):
+        """Очищает кэш процесса"""
+        with self._lock:
+            self._products.clear()
+            self._slugs.clear()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats, size=len(self._products), max_size=self.size)
+        lookups = stats['hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['shared_hits']) / lookups, 4) if lookups else None
+        return stats
+
+
+product_cache = ProductCache(settings.PRODUCT_CACHE_SIZE, settings.PRODUCT_CACHE_SHARED)
@@ -0,0 +1,58 @@
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.middleware.csrf import get_token
+
+from cart.backends import get_cart
+from .cache import product_cache
+
+
+def visitor_state(request):
+    """
+    Части страницы, которые зависят от посетителя: пользователь в шапке,
+    значок корзины и CSRF-токен в формах "В корзину".
+
+    Возвращает None, если у посетителя есть непоказанные сообщения:
+    такую страницу нужно отрисовать заново, иначе сообщения потеряются.
+    """
+    if len(get_messages(request)):
+        return None
+    # get_token создает секрет CSRF заранее, если cookie еще нет,
+    # чтобы ETag первого ответа совпал со следующим запросом
+    get_token(request)
+    return [
+        request.user.pk or '',
+        get_cart(request).count(),
+        request.META['CSRF_COOKIE'],
+    ]
+
+
+def is_personalized(state):
+    """Есть ли на странице что-то, кроме общего для всех содержимого"""
+    return state is None or state[0] != '' or state[1] != 0
+
+
+def make_etag(*parts):
+    return hashlib.md5('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def request_product(request, slug):
+    """Товар по slug (или None); загружается один раз на запрос"""
+    if not hasattr(request, '_product'):
+        request._product = product_cache.get(slug=slug)
+    return request._product
+
+
+def product_etag(request, slug):
+    state = visitor_state(request)
+    product = request_product(request, slug)
+    if state is None or product is None:
+        return None
+    return make_etag('product', product.pk, product.updated_at, *state)
+
+
+def product_last_modified(request, slug):
+    product = request_product(request, slug)
+    if product is None or is_personalized(visitor_state(request)):
+        return None
+    return product.updated_at
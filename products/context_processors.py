@@ -0,0 +1,9 @@
+from .page_cache import CSRF_SENTINEL, is_cache_render
+
+
+def page_cache(request):
+    # В странице для кэша вместо CSRF-токена стоит заглушка,
+    # ее заменяет токен посетителя после выборки из кэша
+    if is_cache_render(request):
+        return {'csrf_token': CSRF_SENTINEL}
+    return {}
@@ -0,0 +1,141 @@
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .version import bump_catalog_version
+
+# Формат Pillow для каждого формата копии
+PIL_FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+
+# Тип для <source type="..."> в теге product_image
+MIME_TYPES = {
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+}
+
+
+def rendition_name(image_name, rendition, image_format):
+    """
+    Путь копии рядом с оригиналом: products/2024/01/01/photo_jpg_card.webp.
+
+    Расширение оригинала входит в имя, иначе photo.jpg и photo.png
+    разных товаров делили бы одни и те же файлы копий.
+    """
+    stem, extension = posixpath.splitext(image_name)
+    extension = extension.lstrip('.').lower()
+    if extension:
+        stem = f'{stem}_{extension}'
+    return f'{stem}_{rendition}.{image_format}'
+
+
+def _prepare(image):
+    """
+    Поворачивает по EXIF и приводит к RGB.
+
+    Прозрачный фон заменяется белым: JPEG прозрачность не поддерживает,
+    а на сайте изображения и так показываются на белом.
+    """
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _encode(image, image_format):
+    buffer = BytesIO()
+    # exif и прочие метаданные не передаются, поэтому в копию не попадают
+    image.save(
+        buffer,
+        PIL_FORMATS[image_format],
+        quality=settings.PRODUCT_IMAGE_FORMATS[image_format],
+        optimize=image_format == 'jpeg',
+        progressive=image_format == 'jpeg',
+    )
+    return ContentFile(buffer.getvalue())
+
+
+def render_image(image_name, storage=default_storage):
+    """
+    Создает все копии изображения из настройки PRODUCT_IMAGE_RENDITIONS.
+
+    Возвращает словарь для поля Product.renditions:
+    {'card': {'width': 480, 'height': 360, 'webp': '...', 'jpeg': '...'}, ...}
+    Изображения меньше нужной ширины не увеличиваются.
+    Функция не обращается к БД, поэтому подходит для пула процессов.
+    """
+    with storage.open(image_name) as source:
+        with Image.open(source) as original:
+            original.load()
+            image = _prepare(original)
+
+    renditions = {}
+    for rendition, width in settings.PRODUCT_IMAGE_RENDITIONS.items():
+        resized = image.copy()
+        resized.thumbnail((min(width, image.width), image.height * width), Image.Resampling.LANCZOS)
+        entry = {'width': resized.width, 'height': resized.height}
+        for image_format in settings.PRODUCT_IMAGE_FORMATS:
+            name = rendition_name(image_name, rendition, image_format)
+            if storage.exists(name):
+                storage.delete(name)
+            entry[image_format] = storage.save(name, _encode(resized, image_format))
+        renditions[rendition] = entry
+    return renditions
+
+
+def delete_renditions(renditions, storage=default_storage):
+    for entry in renditions.values():
+        for image_format in settings.PRODUCT_IMAGE_FORMATS:
+            name = entry.get(image_format)
+            if name and storage.exists(name):
+                storage.delete(name)
+
+
+def delete_replaced_renditions(previous, current, storage=default_storage):
+    """
+    Удаляет файлы прежних копий, которые не вошли в новые.
+
+    Вызывается после сохранения новых копий в товар: до этого на прежние
+    файлы ссылается product.renditions, и витрина показывала бы битые ссылки.
+    """
+    keep = {name for entry in current.values() for name in entry.values()}
+    delete_renditions(
+        {
+            rendition: {key: name for key, name in entry.items() if name not in keep}
+            for rendition, entry in previous.items()
+        },
+        storage,
+    )
+
+
+def process_product_image(product):
+    """
+    Пересоздает копии изображения товара и сохраняет их в product.renditions.
+
+    Вызывается воркером очереди ImageJob; ошибки чтения файла
+    пробрасываются, чтобы задание можно было повторить.
+    """
+    from .models import Product
+
+    previous = product.renditions or {}
+    product.renditions = render_image(product.image.name) if product.image else {}
+    # update() вместо save(): без сигналов. updated_at меняется вместе
+    # с копиями - от него зависят ETag и кэш страниц товара
+    product.updated_at = timezone.now()
+    Product.objects.filter(pk=product.pk).update(
+        renditions=product.renditions,
+        updated_at=product.updated_at,
+    )
+    bump_catalog_version()
+    delete_replaced_renditions(previous, product.renditions)
+    return product.renditions
@@ -0,0 +1,101 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from products.images import delete_replaced_renditions, render_image
+from products.models import Product
+from products.version import bump_catalog_version
+
+
+def _init_worker():
+    # При запуске процессов через spawn Django нужно настроить заново
+    django.setup()
+
+
+def _render(product_id, image_name):
+    try:
+        return product_id, render_image(image_name), None
+    except Exception as error:
+        return product_id, None, f'{type(error).__name__}: {error}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает уменьшенные копии изображений товаров (PRODUCT_IMAGE_RENDITIONS) '
+        'в пуле процессов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Количество процессов (по умолчанию - по числу ядер)',
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать копии и у товаров, где они уже есть',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Сколько результатов сохранять в БД за раз',
+        )
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='')
+        if not options['all']:
+            products = products.filter(renditions={})
+        products = list(products.values_list('id', 'image', 'renditions'))
+        if not products:
+            self.stdout.write('Все изображения уже обработаны')
+            return
+
+        # Старые копии остаются на месте, пока не сохранены новые:
+        # до этого на них ссылается product.renditions, а при ошибке
+        # обработки товар так и останется со старыми копиями
+        self._previous = {product_id: renditions for product_id, _, renditions in products if renditions}
+
+        # Дочерним процессам соединения с БД не нужны:
+        # копии только читают и пишут файлы
+        connections.close_all()
+
+        done = failed = 0
+        pending = []
+        started = time.monotonic()
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            futures = [
+                pool.submit(_render, product_id, image_name)
+                for product_id, image_name, _ in products
+            ]
+            for future in as_completed(futures):
+                product_id, renditions, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f'Товар {product_id}: {error}')
+                    continue
+                pending.append(Product(id=product_id, renditions=renditions))
+                if len(pending) >= options['batch_size']:
+                    done += self._save(pending)
+                    pending = []
+            done += self._save(pending)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {done} товаров за {elapsed:.1f} с, ошибок: {failed}'
+        ))
+
+    def _save(self, products):
+        # bulk_update не вызывает сигналы; updated_at обновляем сами,
+        # чтобы страницы товаров перестали отдаваться из кэша браузера
+        now = timezone.now()
+        for product in products:
+            product.updated_at = now
+        Product.objects.bulk_update(products, ['renditions', 'updated_at'])
+        bump_catalog_version()
+        for product in products:
+            delete_replaced_renditions(self._previous.pop(product.id, {}), product.renditions)
+        self.stdout.write(f'Сохранено копий для товаров: {len(products)}')
+        return len(products)
@@ -0,0 +1,113 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from django.utils import timezone
+
+from products.images import process_product_image
+from products.models import ImageJob
+
+
+class Command(BaseCommand):
+    help = (
+        'Обрабатывает очередь ImageJob: создает копии изображений товаров. '
+        'Неудачные задания повторяются с экспоненциальной задержкой.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Обработать готовые задания и завершиться',
+        )
+        parser.add_argument(
+            '--poll', type=float, default=2,
+            help='Пауза между проверками пустой очереди в секундах',
+        )
+        parser.add_argument(
+            '--max-attempts', type=int, default=5,
+            help='После стольких неудач задание помечается как ошибочное',
+        )
+        parser.add_argument(
+            '--backoff', type=float, default=30,
+            help='Задержка перед первым повтором в секундах (дальше удваивается)',
+        )
+        parser.add_argument(
+            '--stale-after', type=int, default=600,
+            help='Через сколько секунд задание зависшего воркера берется снова',
+        )
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            job = self._claim(options['stale_after'])
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll'])
+                continue
+            self._run(job, options)
+            processed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Обработано заданий: {processed}'))
+
+    def _claim(self, stale_after):
+        """
+        Берет следующее готовое задание.
+
+        Захват - условный UPDATE по статусу, поэтому несколько воркеров
+        не возьмут одно задание дважды.
+        """
+        now = timezone.now()
+        ready = (
+            Q(status=ImageJob.PENDING, run_after__lte=now) |
+            Q(status=ImageJob.RUNNING, locked_at__lt=now - timedelta(seconds=stale_after))
+        )
+        while True:
+            job = ImageJob.objects.filter(ready).order_by('run_after').first()
+            if job is None:
+                return None
+            claimed = ImageJob.objects.filter(
+                pk=job.pk, status=job.status, locked_at=job.locked_at,
+            ).update(
+                status=ImageJob.RUNNING,
+                locked_at=now,
+                attempts=F('attempts') + 1,
+            )
+            if claimed:
+                job.refresh_from_db()
+                return job
+
+    def _run(self, job, options):
+        started = time.monotonic()
+        try:
+            process_product_image(job.product)
+        except Exception as error:
+            self._failed(job, error, options)
+            return
+
+        # Пока задание выполнялось, изображение могли заменить еще раз:
+        # тогда enqueue() вернул его в очередь, и отмечать его не нужно
+        ImageJob.objects.filter(pk=job.pk, status=ImageJob.RUNNING, locked_at=job.locked_at).update(
+            status=ImageJob.DONE,
+            locked_at=None,
+            last_error='',
+        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(f'Товар {job.product_id}: копии готовы за {elapsed:.2f} с')
+
+    def _failed(self, job, error, options):
+        message = f'{type(error).__name__}: {error}'
+        if job.attempts >= options['max_attempts']:
+            status, run_after = ImageJob.FAILED, job.run_after
+            self.stderr.write(f'Товар {job.product_id}: {message}, попытки исчерпаны')
+        else:
+            delay = options['backoff'] * 2 ** (job.attempts - 1)
+            status, run_after = ImageJob.PENDING, timezone.now() + timedelta(seconds=delay)
+            self.stderr.write(f'Товар {job.product_id}: {message}, повтор через {delay:.0f} с')
+        ImageJob.objects.filter(pk=job.pk, status=ImageJob.RUNNING, locked_at=job.locked_at).update(
+            status=status,
+            run_after=run_after,
+            locked_at=None,
+            last_error=message,
+        )
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+FTS_TABLE = 'products_product_fts'
+
+
+def create_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        "name, description, tokenize='unicode61 remove_diacritics 2')"
+    )
+    # ё заменяется на е так же, как в products.search.fold_yo
+    schema_editor.execute(
+        f'INSERT INTO {FTS_TABLE} (rowid, name, description) '
+        "SELECT id, replace(replace(name, 'ё', 'е'), 'Ё', 'Е'), "
+        "replace(replace(description, 'ё', 'е'), 'Ё', 'Е') FROM products_product"
+    )
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_catalog_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+def queue_existing_images(apps, schema_editor):
+    # Товары, загруженные до очереди заданий, копий не имеют:
+    # ставим им задания, и run_image_worker создаст копии
+    Product = apps.get_model('products', 'Product')
+    ImageJob = apps.get_model('products', 'ImageJob')
+    ids = list(
+        Product.objects.exclude(image='')
+        .filter(renditions={}, image_job__isnull=True)
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+    ImageJob.objects.bulk_create(
+        [ImageJob(product_id=product_id) for product_id in ids],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_imagejob'),
+    ]
+
+    operations = [
+        migrations.RunPython(queue_existing_images, migrations.RunPython.noop),
+    ]
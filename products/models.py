@@ -1,5 +1,33 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.urls import reverse
+from django.utils import timezone
+
+
+class ProductQuerySet(models.QuerySet):
+    def with_sales_stats(self):
+        """
+        Добавляет к товарам проданное количество и выручку одним запросом.
+
+        Итоги считаются коррелированным подзапросом по индексу строк заказа
+        (sales_quantity, sales_revenue), поэтому страница товаров с LIMIT
+        не агрегирует продажи всего каталога.
+        """
+        from orders.models import OrderItem
+
+        items = OrderItem.objects.filter(product=models.OuterRef('pk')).values('product')
+        quantity = items.annotate(total=models.Sum('quantity')).values('total')
+        revenue = items.annotate(
+            total=models.Sum(models.F('quantity') * models.F('price'))
+        ).values('total')
+        money = models.DecimalField(max_digits=12, decimal_places=2)
+        return self.annotate(
+            sales_quantity=Coalesce(models.Subquery(quantity), 0),
+            sales_revenue=Coalesce(
+                models.Subquery(revenue, output_field=money),
+                models.Value(0, output_field=money),
+            ),
+        )
 
 
 class Product(models.Model):
@@ -8,17 +36,41 @@ class Product(models.Model):
     description = models.TextField(verbose_name='Описание')
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Цена')
     image = models.ImageField(upload_to='products/%Y/%m/%d/', verbose_name='Изображение')
+    # Уменьшенные копии изображения (см. products.images.render_image)
+    renditions = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Копии изображения')
     is_available = models.BooleanField(default=True, verbose_name='Доступен')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создан')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Обновлен')
+
+    objects = ProductQuerySet.as_manager()
     
     class Meta:
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
         ordering = ['-created_at']
+        indexes = [
+            # Индекс под keyset-пагинацию каталога (см. core.pagination).
+            # Частичный: SQLite превращает is_available=True в условие
+            # без сравнения, и в составном индексе оно не используется
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=models.Q(is_available=True),
+                name='product_catalog_idx',
+            ),
+            # Список всех товаров в админ-панели (та же пагинация)
+            models.Index(fields=['-created_at', '-id'], name='product_created_idx'),
+        ]
     
     def __str__(self):
         return self.name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Имя файла на момент загрузки: по нему сигнал понимает,
+        # что изображение заменили и копии нужно пересоздать
+        instance._loaded_image = instance.__dict__.get('image')
+        return instance
     
     def get_absolute_url(self):
         return reverse('products:product_detail', args=[self.slug])
@@ -26,6 +78,8 @@ class Product(models.Model):
     @property
     def total_ordered(self):
         """Общее количество заказанного товара"""
+        if 'sales_quantity' in self.__dict__:
+            return self.sales_quantity
         from orders.models import OrderItem
         return OrderItem.objects.filter(product=self).aggregate(
             total=models.Sum('quantity')
@@ -34,8 +88,65 @@ class Product(models.Model):
     @property
     def total_revenue(self):
         """Общая выручка от товара"""
+        if 'sales_revenue' in self.__dict__:
+            return self.sales_revenue
         from orders.models import OrderItem
         return OrderItem.objects.filter(product=self).aggregate(
             total=models.Sum(models.F('quantity') * models.F('price'))
         )['total'] or 0
-    
\ No newline at end of file
+    
+
+
+class ImageJob(models.Model):
+    """
+    Задание на создание копий изображения товара.
+
+    Копии создает отдельный процесс (manage.py run_image_worker), чтобы
+    сохранение товара в админ-панели не ждало обработки изображения.
+    На товар не больше одного задания: повторная загрузка перезапускает его.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Ожидает'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='image_job', verbose_name='Товар')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING, verbose_name='Статус')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Попыток')
+    run_after = models.DateTimeField(default=timezone.now, verbose_name='Не раньше')
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name='Взято в работу')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    created = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
+    updated = models.DateTimeField(auto_now=True, verbose_name='Обновлено')
+
+    class Meta:
+        verbose_name = 'Обработка изображения'
+        verbose_name_plural = 'Обработка изображений'
+        indexes = [
+            # Выбор следующего задания воркером
+            models.Index(fields=['status', 'run_after'], name='imagejob_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id}: {self.status}'
+
+    @classmethod
+    def enqueue(cls, product):
+        """Ставит (или перезапускает) задание для товара"""
+        job, _ = cls.objects.update_or_create(
+            product=product,
+            defaults={
+                'status': cls.PENDING,
+                'attempts': 0,
+                'run_after': timezone.now(),
+                'locked_at': None,
+                'last_error': '',
+            },
+        )
+        return job
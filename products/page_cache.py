@@ -0,0 +1,109 @@
+import hashlib
+import re
+import threading
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from .conditional import make_etag, visitor_state
+from .version import catalog_version
+
+# Счетчики попаданий этого процесса: общий счетчик в кэше требовал бы
+# записи (и блокировки записи SQLiteCache) на каждый запрос страницы
+stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+# Подставляется вместо CSRF-токена при отрисовке страницы для кэша
+CSRF_SENTINEL = 'page-cache-csrf-token-sentinel'
+PERSONAL_MARKER = '<!--personal:{}-->'
+PERSONAL_RE = re.compile(r'<!--personal:([\w/.-]+)-->')
+
+
+def _count(name):
+    with _stats_lock:
+        stats[name] += 1
+
+
+def page_cache_stats():
+    with _stats_lock:
+        result = dict(stats)
+    total = result['hits'] + result['misses']
+    result['hit_rate'] = round(result['hits'] / total, 4) if total else None
+    result['catalog_version'] = catalog_version()
+    return result
+
+
+def is_cache_render(request):
+    """Страница отрисовывается для кэша: личные части заменяются метками"""
+    return getattr(request, '_page_cache_render', False)
+
+
+def _page_key(request):
+    path = hashlib.md5(f'{request.get_host()}{request.get_full_path()}'.encode()).hexdigest()
+    return f'products:page:{catalog_version()}:{path}'
+
+
+def fill_personal(request, content):
+    """Подставляет в страницу из кэша части текущего посетителя"""
+    content = content.decode()
+    content = PERSONAL_RE.sub(
+        lambda match: render_to_string(match.group(1), request=request),
+        content,
+    )
+    if CSRF_SENTINEL in content:
+        content = content.replace(CSRF_SENTINEL, get_token(request))
+    return content.encode()
+
+
+def cache_anonymous_page(view):
+    """
+    Кэш целых страниц для анонимных GET-запросов.
+
+    Страница отрисовывается с метками вместо значка корзины и сообщений
+    (тег {% personal %}) и с заглушкой вместо CSRF-токена. После выборки
+    из кэша метки заменяются частями текущего посетителя, поэтому одна
+    запись кэша подходит всем анонимным посетителям.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+
+        key = _page_key(request)
+        cached = cache.get(key)
+        if cached is None:
+            _count('misses')
+            request._page_cache_render = True
+            try:
+                response = view(request, *args, **kwargs)
+            finally:
+                request._page_cache_render = False
+            if response.status_code != 200 or response.streaming:
+                return response
+            cached = (response.content, response['Content-Type'])
+            cache.set(key, cached, settings.PAGE_CACHE_TIMEOUT)
+        else:
+            _count('hits')
+
+        content, content_type = cached
+        # ETag - по записи кэша и частям посетителя (в самой странице
+        # CSRF-токен каждый раз маскируется по-новому)
+        state = visitor_state(request)
+        etag = None if state is None else f'"{make_etag(hashlib.md5(content).hexdigest(), *state)}"'
+        if etag is not None:
+            response = get_conditional_response(request, etag=etag)
+            if response is not None:
+                return response
+
+        response = HttpResponse(fill_personal(request, content), content_type=content_type)
+        if etag is not None:
+            response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    return wrapper
@@ -0,0 +1,119 @@
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from core.pagination import encode_cursor, decode_cursor, keyset_page
+from .models import Product
+
+# Полнотекстовый индекс FTS5 по названию и описанию товара
+# (таблица создается миграцией 0003_product_fts).
+# Токенизатор unicode61 приводит к нижнему регистру в том числе кириллицу,
+# поэтому "Свежий" и "свежий" находятся одинаково. Но ё и е для него разные
+# буквы, так что и индексируемый текст, и запрос проходят через fold_yo.
+FTS_TABLE = 'products_product_fts'
+
+# Веса колонок для bm25: совпадение в названии важнее, чем в описании
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+
+def fold_yo(text):
+    """Заменяет ё на е: «свекла» должна находить «Свёкла»"""
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def fold_yo_sql(column):
+    """То же, что fold_yo, выражением SQL"""
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def fts_available():
+    """FTS5 используется только на SQLite"""
+    return connection.vendor == 'sqlite'
+
+
+def rebuild_index():
+    """Полностью перестраивает индекс по таблице товаров"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, description) '
+            f'SELECT id, {fold_yo_sql("name")}, {fold_yo_sql("description")} FROM products_product'
+        )
+        cursor.execute(f'SELECT count(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def index_product(product):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product.id])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)',
+            [product.id, fold_yo(product.name), fold_yo(product.description)],
+        )
+
+
+def unindex_product(product_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product_id])
+
+
+def build_match_query(text):
+    """
+    Превращает пользовательский ввод в выражение MATCH.
+
+    Каждое слово берется в кавычки (чтобы операторы FTS5 в запросе
+    не ломали синтаксис) и ищется по префиксу.
+    """
+    words = re.findall(r'\w+', fold_yo(text.lower()))
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_page(search_query, cursor=None, per_page=24):
+    """
+    Страница результатов поиска, отсортированная по релевантности (bm25).
+
+    Пагинация keyset по паре (score, id), так же как в каталоге.
+    Возвращает список товаров и курсор следующей страницы.
+    """
+    if not fts_available():
+        products = Product.objects.filter(is_available=True).filter(
+            Q(name__icontains=search_query) |
+            Q(description__icontains=search_query)
+        )
+        return keyset_page(products, cursor=cursor, per_page=per_page)
+
+    match = build_match_query(search_query)
+    if not match:
+        return [], None
+
+    score = f'bm25({FTS_TABLE}, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT})'
+    sql = (
+        f'SELECT p.id, {score} AS score FROM {FTS_TABLE} '
+        f'JOIN products_product p ON p.id = {FTS_TABLE}.rowid '
+        f'WHERE {FTS_TABLE} MATCH %s AND p.is_available'
+    )
+    params = [match]
+
+    position = decode_cursor(cursor, parse=float)
+    if position:
+        last_score, last_id = position
+        sql += f' AND ({score} > %s OR ({score} = %s AND p.id > %s))'
+        params += [last_score, last_score, last_id]
+
+    sql += ' ORDER BY score, p.id LIMIT %s'
+    params.append(per_page + 1)
+
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        rows = db_cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last_id, last_score = rows[-1]
+        next_cursor = encode_cursor(last_score, last_id)
+
+    products = Product.objects.in_bulk([pk for pk, _ in rows])
+    return [products[pk] for pk, _ in rows if pk in products], next_cursor
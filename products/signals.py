@@ -0,0 +1,69 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import search
+from .cache import product_cache
+from .images import delete_renditions
+from .models import ImageJob, Product
+from .suggest import suggest_index
+from .version import bump_catalog_version
+
+
+def catalog_changed():
+    """
+    Новая версия каталога после фиксации транзакции.
+
+    Если поднять версию раньше, параллельный запрос может положить
+    в кэш под новой версией страницу со старыми данными.
+    """
+    def bump():
+        version = bump_catalog_version()
+        # Индекс подсказок этого процесса уже обновлен сигналом; если до
+        # изменения он был актуален, перестраивать его заново не нужно
+        if suggest_index.is_built and suggest_index.version == version - 1:
+            suggest_index.version = version
+    transaction.on_commit(bump)
+
+
+def image_changed(product):
+    loaded = getattr(product, '_loaded_image', None)
+    if loaded is None:
+        return bool(product.image)
+    return str(loaded) != product.image.name
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, raw=False, **kwargs):
+    product_cache.invalidate(instance.pk)
+    # Поддерживаем полнотекстовый индекс в актуальном состоянии
+    if not raw and search.fts_available():
+        search.index_product(instance)
+    # Подсказки обновляем точечно, только если индекс уже построен
+    if suggest_index.is_built:
+        suggest_index.update(instance)
+    # Новое или замененное изображение: старые копии удаляем сразу
+    # (до готовности новых шаблоны покажут оригинал), а новые создает
+    # воркер run_image_worker - сохранение не ждет обработки
+    if not raw and image_changed(instance):
+        if instance.renditions:
+            delete_renditions(instance.renditions)
+            instance.renditions = {}
+            Product.objects.filter(pk=instance.pk).update(renditions={})
+        if instance.image:
+            ImageJob.enqueue(instance)
+        instance._loaded_image = instance.image.name
+    if not raw:
+        catalog_changed()
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    product_cache.invalidate(instance.pk)
+    if search.fts_available():
+        search.unindex_product(instance.id)
+    if suggest_index.is_built:
+        suggest_index.remove(instance.id)
+    if instance.renditions:
+        delete_renditions(instance.renditions)
+    catalog_changed()
@@ -0,0 +1,121 @@
+import threading
+from bisect import bisect_left, insort
+
+from django.urls import reverse
+
+from .models import Product
+from .version import catalog_version
+
+
+def normalize(text):
+    """Нормализация для поиска по префиксу: регистр, ё/е и лишние пробелы"""
+    return ' '.join(text.lower().replace('ё', 'е').split())
+
+
+class PrefixIndex:
+    """
+    Индекс подсказок по названиям товаров в памяти процесса.
+
+    Хранит отсортированный массив ключей (нормализованный хвост названия, id):
+    для каждого слова названия свой ключ, поэтому "укр" находит
+    и "Укроп", и "Свежий укроп". Поиск - бинарный, без запросов к БД.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []
+        self._products = {}
+        self.is_built = False
+        # Версия каталога, по которой построен индекс (products.page_cache)
+        self.version = None
+
+    @staticmethod
+    def _make_keys(product_id, name):
+        words = normalize(name).split(' ')
+        return [(' '.join(words[i:]), product_id) for i in range(len(words)) if words[i]]
+
+    def build(self, products, version=None):
+        keys = []
+        entries = {}
+        for product_id, name, slug in products:
+            entries[product_id] = (name, slug)
+            keys.extend(self._make_keys(product_id, name))
+        keys.sort()
+        with self._lock:
+            self._keys = keys
+            self._products = entries
+            self.is_built = True
+            self.version = version
+
+    def _remove_locked(self, product_id):
+        entry = self._products.pop(product_id, None)
+        if entry is None:
+            return
+        for key in self._make_keys(product_id, entry[0]):
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+
+    def update(self, product):
+        with self._lock:
+            self._remove_locked(product.id)
+            if product.is_available:
+                self._products[product.id] = (product.name, product.slug)
+                for key in self._make_keys(product.id, product.name):
+                    insort(self._keys, key)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove_locked(product_id)
+
+    def lookup(self, prefix, limit=10):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        results = []
+        seen = set()
+        with self._lock:
+            position = bisect_left(self._keys, (prefix,))
+            while position < len(self._keys) and len(results) < limit:
+                key, product_id = self._keys[position]
+                if not key.startswith(prefix):
+                    break
+                if product_id not in seen:
+                    seen.add(product_id)
+                    results.append((product_id, *self._products[product_id]))
+                position += 1
+        return results
+
+
+suggest_index = PrefixIndex()
+_build_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Индекс строится при первом обращении в процессе и перестраивается,
+    когда версия каталога меняется (в том числе из другого процесса)
+    """
+    version = catalog_version()
+    if not suggest_index.is_built or suggest_index.version != version:
+        with _build_lock:
+            if not suggest_index.is_built or suggest_index.version != version:
+                suggest_index.build(
+                    Product.objects.filter(is_available=True)
+                    .values_list('id', 'name', 'slug')
+                    .iterator(),
+                    version=version,
+                )
+    return suggest_index
+
+
+def suggest(query, limit=10):
+    return [
+        {
+            'id': product_id,
+            'name': name,
+            'url': reverse('products:product_detail', args=[slug]),
+        }
+        for product_id, name, slug in get_index().lookup(query, limit)
+    ]
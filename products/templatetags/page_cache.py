@@ -0,0 +1,22 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from products.page_cache import PERSONAL_MARKER, is_cache_render
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def personal(context, template_name):
+    """
+    Часть страницы, своя для каждого посетителя (значок корзины, сообщения).
+
+    {% personal 'includes/cart_badge.html' %}
+
+    Обычно работает как include. При отрисовке страницы для кэша
+    (products.page_cache) выводит метку, которую заменяют после выборки.
+    """
+    request = context.get('request')
+    if request is not None and is_cache_render(request):
+        return mark_safe(PERSONAL_MARKER.format(template_name))
+    return context.template.engine.get_template(template_name).render(context)
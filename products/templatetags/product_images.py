@@ -0,0 +1,44 @@
+from django import template
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
+from django.utils.html import format_html, format_html_join
+
+from products.images import MIME_TYPES
+
+register = template.Library()
+
+
+@register.simple_tag
+def product_image(product, rendition='card', **attrs):
+    """
+    Изображение товара нужного размера.
+
+    {% product_image product 'thumb' class='rounded' style='width: 80px' %}
+
+    Выводит <picture>: по <source> на каждый формат из PRODUCT_IMAGE_FORMATS
+    в порядке настройки, последний формат - в <img> для остальных браузеров.
+    Пока копии не созданы воркером, показывает оригинал: он тяжелее,
+    но товар не остается без изображения.
+    """
+    if not product.image:
+        return ''
+    attrs.setdefault('loading', 'lazy')
+    entry = (product.renditions or {}).get(rendition) or {}
+    # Форматы, добавленные в настройку позже, есть не у всех копий
+    formats = [image_format for image_format in settings.PRODUCT_IMAGE_FORMATS if entry.get(image_format)]
+    if not formats:
+        return format_html('<img src="{}" alt="{}"{}>', product.image.url, product.name, flatatt(attrs))
+    *sources, fallback = formats
+    return format_html(
+        '<picture>{}<img src="{}" width="{}" height="{}" alt="{}"{}></picture>',
+        format_html_join(
+            '', '<source type="{}" srcset="{}">',
+            ((MIME_TYPES[image_format], default_storage.url(entry[image_format])) for image_format in sources),
+        ),
+        default_storage.url(entry[fallback]),
+        entry['width'],
+        entry['height'],
+        product.name,
+        flatatt(attrs),
+    )
@@ -1,3 +1,574 @@
-from django.test import TestCase
+import re
+import tempfile
+from datetime import timedelta
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from core.pagination import encode_cursor
+from core.testing import QueryPlanMixin, analyze, make_products, sqlite_only
+from .cache import ProductCache, product_cache
+from .images import render_image
+from .models import ImageJob, Product
+from .version import bump_catalog_version, catalog_version
+from .page_cache import page_cache_stats
+from .search import rebuild_index, search_page
+from .suggest import suggest_index
+from .templatetags.product_images import product_image
+
+
+@sqlite_only
+class CatalogQueryPlanTests(QueryPlanMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_products(200)
+        rebuild_index()
+        analyze()
+
+    def setUp(self):
+        # Иначе страницы отдаются из кэша страниц без запросов к БД
+        cache.clear()
+
+    def test_catalog_pages(self):
+        with self.assertNoFullScans():
+            response = self.client.get(reverse('products:home'))
+            self.client.get(reverse('products:catalog_page'), {'cursor': response.context['next_cursor']})
+
+    def test_search(self):
+        with self.assertNoFullScans():
+            self.client.get(reverse('products:home'), {'search': 'товар'})
+
+    def test_product_detail(self):
+        with self.assertNoFullScans():
+            self.client.get(reverse('products:product_detail', args=['product-5']))
+
+
+@override_settings(CATALOG_PAGE_SIZE=5)
+class CatalogPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        products = make_products(14)
+        # Половина товаров с одинаковой датой: порядок внутри нее задает id
+        moment = timezone.now()
+        for i, product in enumerate(products):
+            product.created_at = moment if i % 2 else moment - timedelta(minutes=i)
+            product.is_available = i != 3
+        Product.objects.bulk_update(products, ['created_at', 'is_available'])
+        cls.expected = list(
+            Product.objects.filter(is_available=True)
+            .order_by('-created_at', '-id')
+            .values_list('id', flat=True)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def page(self, cursor=None):
+        params = {'cursor': cursor} if cursor else {}
+        response = self.client.get(reverse('products:catalog_page'), params)
+        self.assertEqual(response.status_code, 200)
+        return [product.id for product in response.context['products']], response.context['next_cursor']
+
+    def test_cursor_walks_whole_catalog(self):
+        seen, cursor = self.page()
+        while cursor:
+            ids, cursor = self.page(cursor)
+            seen += ids
+        self.assertEqual(seen, self.expected)
+
+    def test_tampered_cursor_starts_from_first_page(self):
+        first_page, _ = self.page()
+        bad_cursors = [
+            'garbage', '%%%',
+            encode_cursor('not a date', 1),
+            encode_cursor(timezone.now(), 'x'),
+            'MjAyNC0wMS0wMQ',  # дата без id
+        ]
+        for bad in bad_cursors:
+            with self.subTest(cursor=bad):
+                self.assertEqual(self.page(bad)[0], first_page)
+
+
+@sqlite_only
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.in_name = Product.objects.create(
+            name='Зеленый чай', slug='green-tea', description='Листовой', price=1)
+        cls.in_description = Product.objects.create(
+            name='Набор', slug='set', description='Чашка и зеленый чай в подарок', price=1)
+        cls.other = Product.objects.create(
+            name='Кофе', slug='coffee', description='Молотый', price=1)
+        cls.beet = Product.objects.create(
+            name='Свёкла', slug='beet', description='Столовая', price=1)
+
+    def search(self, query, **kwargs):
+        products, _ = search_page(query, **kwargs)
+        return [product.pk for product in products]
+
+    def test_name_match_ranks_first(self):
+        self.assertEqual(self.search('зеленый чай'), [self.in_name.pk, self.in_description.pk])
+
+    def test_case_and_prefix(self):
+        self.assertEqual(self.search('ЗЕЛЕН'), [self.in_name.pk, self.in_description.pk])
+        self.assertEqual(self.search('моло'), [self.other.pk])
+        # ё и е не различаются ни в запросе, ни в индексе
+        self.assertEqual(self.search('свекла'), [self.beet.pk])
+        self.assertEqual(self.search('СВЁК'), [self.beet.pk])
+        rebuild_index()
+        self.assertEqual(self.search('свекла'), [self.beet.pk])
+        # Кавычки и операторы FTS5 в запросе не ломают синтаксис
+        self.assertEqual(self.search('"кофе*('), [self.other.pk])
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_cursor_pages(self):
+        first, cursor = search_page('чай', per_page=1)
+        second, next_cursor = search_page('чай', cursor=cursor, per_page=1)
+        self.assertEqual([first[0].pk, second[0].pk], [self.in_name.pk, self.in_description.pk])
+        self.assertIsNone(next_cursor)
+
+    def test_index_follows_changes(self):
+        self.other.name = 'Какао'
+        self.other.save()
+        self.assertEqual(self.search('какао'), [self.other.pk])
+        self.assertEqual(self.search('кофе'), [])
+
+        self.in_name.is_available = False
+        self.in_name.save()
+        self.assertEqual(self.search('зеленый'), [self.in_description.pk])
+
+        self.in_description.delete()
+        self.assertEqual(self.search('зеленый'), [])
+
+
+class SuggestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fresh = Product.objects.create(name='Свежий укроп', slug='fresh-dill', description='', price=1)
+        cls.dried = Product.objects.create(name='Укроп сушеный', slug='dried-dill', description='', price=1)
+        cls.berry = Product.objects.create(name='Ёжевика', slug='berry', description='', price=1)
+
+    def setUp(self):
+        cache.clear()
+        # Индекс живет в памяти процесса: каждый тест строит его заново
+        suggest_index.is_built = False
+
+    def suggest(self, query):
+        response = self.client.get(reverse('products:suggest'), {'q': query})
+        return sorted(result['name'] for result in response.json()['results'])
+
+    def test_prefix_of_any_word(self):
+        self.assertEqual(self.suggest('УКР'), ['Свежий укроп', 'Укроп сушеный'])
+        self.assertEqual(self.suggest('свежий  ук'), ['Свежий укроп'])
+        self.assertEqual(self.suggest('ежев'), ['Ёжевика'])
+        self.assertEqual(self.suggest('роп'), [])
+        self.assertEqual(self.suggest('  '), [])
+
+    def test_index_follows_changes(self):
+        self.suggest('укр')
+        self.dried.name = 'Петрушка'
+        self.dried.save()
+        self.fresh.is_available = False
+        self.fresh.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('укр'), [])
+        self.assertEqual(self.suggest('петр'), ['Петрушка'])
+        self.assertEqual(self.suggest('су'), [])
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = make_products(5)
+        cls.user = User.objects.create_user('shopper')
+
+    def setUp(self):
+        cache.clear()
+        product_cache.clear()
+        self.urls = [
+            reverse('products:home'),
+            reverse('products:catalog_page'),
+            reverse('products:product_detail', args=['product-1']),
+        ]
+
+    def etags(self):
+        """ETag каждой страницы; повторный запрос с ним получает 304"""
+        etags = []
+        for url in self.urls:
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304, url)
+            etags.append(etag)
+        return etags
+
+    def assertAllChanged(self, before, after):
+        for url, old, new in zip(self.urls, before, after):
+            self.assertNotEqual(old, new, url)
+
+    def test_not_modified_for_anonymous_and_logged_in(self):
+        anonymous = self.etags()
+        self.client.force_login(self.user)
+        self.assertAllChanged(anonymous, self.etags())
+
+    def test_cart_change(self):
+        before = self.etags()
+        self.client.post(reverse('cart:cart_add', args=[self.products[0].pk]))
+        # Сообщение о добавлении показывается на первой же странице
+        self.client.get(self.urls[0])
+        self.assertAllChanged(before, self.etags())
+
+    def test_product_save(self):
+        before = self.etags()
+        with self.captureOnCommitCallbacks(execute=True):
+            for product in self.products:
+                product.name += ' (новинка)'
+                product.save()
+        self.assertAllChanged(before, self.etags())
+
+    def test_pending_messages_prevent_not_modified(self):
+        home, fragment, detail = self.urls
+        # Фрагмент каталога сообщений не выводит, поэтому он последний
+        for url in [home, detail, fragment]:
+            etag = self.client.get(url)['ETag']
+            self.client.post(reverse('cart:cart_add', args=[self.products[0].pk]))
+            self.client.post(reverse('cart:cart_remove', args=[self.products[0].pk]))
+            # Корзина вернулась в прежнее состояние, но сообщения еще не показаны
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, url)
+            if url != fragment:
+                self.assertContains(response, 'Товар удален из корзины')
+        self.assertContains(self.client.get(home), 'Товар удален из корзины')
+
+    def test_unknown_slug(self):
+        url = reverse('products:product_detail', args=['missing'])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='*').status_code, 404)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='*').status_code, 404)
+
+
+class ProductCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = make_products(3)
+
+    def setUp(self):
+        cache.clear()
+        product_cache.clear()
+
+    def test_repeat_get_skips_database(self):
+        product = self.products[0]
+        self.assertEqual(product_cache.get(pk=product.pk), product)
+        with self.assertNumQueries(0):
+            self.assertEqual(product_cache.get(pk=product.pk).name, product.name)
+            self.assertEqual(product_cache.get(slug=product.slug), product)
+            self.assertEqual(product_cache.get_many([product.pk]), {product.pk: product})
+
+    def test_lru_eviction(self):
+        products = ProductCache(size=2)
+        first, second, third = self.products
+        products.get(pk=first.pk)
+        products.get(pk=second.pk)
+        products.get(pk=first.pk)  # second теперь самый старый
+        products.get(pk=third.pk)
+        with self.assertNumQueries(0):
+            products.get(pk=first.pk)
+            products.get(pk=third.pk)
+        with self.assertNumQueries(1):
+            products.get(slug=second.slug)
+        stats = products.get_stats()
+        self.assertEqual(
+            {key: stats[key] for key in ('hits', 'shared_hits', 'misses', 'evictions', 'size', 'max_size')},
+            {'hits': 3, 'shared_hits': 0, 'misses': 4, 'evictions': 2, 'size': 2, 'max_size': 2},
+        )
+        self.assertEqual(stats['hit_rate'], round(3 / 7, 4))
+
+    def test_new_catalog_version_drops_process_copy(self):
+        product = self.products[0]
+        product_cache.get(pk=product.pk)
+        # Товар изменен в другом процессе: сигнал здесь не срабатывал
+        Product.objects.filter(pk=product.pk).update(name='Изменен в другом процессе')
+        self.assertEqual(product_cache.get(pk=product.pk).name, product.name)
+        bump_catalog_version()
+        self.assertEqual(product_cache.get(pk=product.pk).name, 'Изменен в другом процессе')
+
+    def test_signals_invalidate(self):
+        first, second = self.products[:2]
+        product_cache.get_many([first.pk, second.pk])
+        # Версия каталога еще не поднята (on_commit не выполнен), товар
+        # убирает из кэша сам сигнал
+        first.name = 'Новое название'
+        first.save()
+        self.assertEqual(product_cache.get(pk=first.pk).name, 'Новое название')
+        second.delete()
+        self.assertIsNone(product_cache.get(pk=second.pk))
+        self.assertEqual(product_cache.get_many([second.pk]), {})
+
+    def test_save_gives_fresh_value(self):
+        product = self.products[2]
+        product_cache.get(slug=product.slug)
+        product.price = 555
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertEqual(product_cache.get(slug=product.slug).price, 555)
+        with self.assertNumQueries(0):
+            self.assertEqual(product_cache.get(pk=product.pk).price, 555)
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = make_products(5)
+
+    def setUp(self):
+        cache.clear()
+        product_cache.clear()
+
+    def assertServed(self, client, url, hits=0, misses=0):
+        before = page_cache_stats()
+        response = client.get(url)
+        after = page_cache_stats()
+        self.assertEqual((after['hits'] - before['hits'], after['misses'] - before['misses']), (hits, misses))
+        return response
+
+    def test_hit_does_not_write_to_cache(self):
+        url = reverse('products:product_detail', args=['product-1'])
+        before = page_cache_stats()
+        self.client.get(url)
+        with mock.patch.object(cache, 'incr') as incr, mock.patch.object(cache, 'set') as set_:
+            response = self.client.get(url)
+        self.assertContains(response, 'Товар 1')
+        incr.assert_not_called()
+        set_.assert_not_called()
+        after = page_cache_stats()
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+
+    def test_personal_parts_of_cached_page(self):
+        url = reverse('products:product_detail', args=['product-1'])
+        first = Client()
+        first.post(reverse('cart:cart_add', args=[self.products[2].pk]))
+        first.post(reverse('cart:cart_add', args=[self.products[3].pk]))
+        response = self.assertServed(first, url, misses=1)
+        self.assertContains(response, 'cart-badge">2<')
+        self.assertContains(response, 'добавлен в корзину')
+
+        second = Client(enforce_csrf_checks=True)
+        response = self.assertServed(second, url, hits=1)
+        self.assertNotContains(response, 'cart-badge">')
+        self.assertNotContains(response, 'добавлен в корзину')
+        # Свой CSRF-токен: форма "В корзину" из кэшированной страницы работает
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode()).group(1)
+        response = second.post(reverse('cart:cart_add', args=[self.products[1].pk]), {'csrfmiddlewaretoken': token})
+        self.assertEqual(response.status_code, 302)
+
+        response = self.assertServed(second, url, hits=1)
+        self.assertContains(response, 'cart-badge">1<')
+        self.assertContains(response, f'Товар &quot;{self.products[1].name}&quot; добавлен в корзину')
+        self.assertNotContains(self.assertServed(first, url, hits=1), 'добавлен в корзину')
+
+    def test_product_save_makes_next_request_a_miss(self):
+        url = reverse('products:product_detail', args=['product-1'])
+        self.assertServed(self.client, url, misses=1)
+        self.assertServed(self.client, url, hits=1)
+        product = Product.objects.get(slug='product-1')
+        product.name = 'Товар 1 (новинка)'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertContains(self.assertServed(self.client, url, misses=1), 'Товар 1 (новинка)')
+
+    def test_authenticated_requests_skip_cache(self):
+        url = reverse('products:product_detail', args=['product-1'])
+        self.client.force_login(User.objects.create_user('shopper'))
+        with mock.patch.object(cache, 'get') as get, mock.patch.object(cache, 'set') as set_:
+            self.assertServed(self.client, url)
+            self.assertServed(self.client, url)
+        self.assertFalse(any('products:page' in str(call) for call in get.call_args_list + set_.call_args_list))
+
+
+@override_settings(MEDIA_URL='/media/')
+class ProductImageTagTests(SimpleTestCase):
+    def make_product(self):
+        return Product(name='Чай', image='products/tea.jpg', renditions={'card': {
+            'width': 480, 'height': 360,
+            'webp': 'products/tea_card.webp', 'jpeg': 'products/tea_card.jpeg',
+        }})
+
+    def test_sources_follow_formats_setting(self):
+        html = product_image(self.make_product())
+        self.assertInHTML(
+            '<picture><source type="image/webp" srcset="/media/products/tea_card.webp">'
+            '<img src="/media/products/tea_card.jpeg" width="480" height="360" alt="Чай" loading="lazy">'
+            '</picture>',
+            html,
+        )
+        with self.settings(PRODUCT_IMAGE_FORMATS={'jpeg': 82, 'webp': 80}):
+            html = product_image(self.make_product())
+        self.assertIn('<source type="image/jpeg" srcset="/media/products/tea_card.jpeg">', html)
+        self.assertIn('<img src="/media/products/tea_card.webp"', html)
+
+    def test_original_until_renditions_are_ready(self):
+        product = self.make_product()
+        product.renditions = {}
+        self.assertInHTML('<img src="/media/products/tea.jpg" alt="Чай" loading="lazy">', product_image(product))
+
+    def test_format_missing_from_old_renditions(self):
+        product = self.make_product()
+        del product.renditions['card']['webp']
+        html = product_image(product)
+        self.assertNotIn('<source', html)
+        self.assertIn('<img src="/media/products/tea_card.jpeg"', html)
+
+
+class QueueExistingImagesTests(TestCase):
+    def test_queues_products_without_renditions(self):
+        ready, missing, failed, other = make_products(4)
+        Product.objects.create(name='Без фото', slug='no-image', description='', price=1)
+        Product.objects.filter(pk=ready.pk).update(renditions={'card': {'jpeg': 'products/0_card.jpeg'}})
+        ImageJob.objects.all().delete()
+        ImageJob.objects.create(product=failed, status=ImageJob.FAILED)
+
+        migration = import_module('products.migrations.0007_queue_existing_images')
+        migration.queue_existing_images(apps, None)
+
+        # Готовые копии, товар без фото и уже поставленное задание не трогаются
+        jobs = dict(ImageJob.objects.values_list('product_id', 'status'))
+        self.assertEqual(jobs, {
+            missing.pk: ImageJob.PENDING,
+            failed.pk: ImageJob.FAILED,
+            other.pk: ImageJob.PENDING,
+        })
+
+
+class TempMediaMixin:
+    """Файлы изображений во временном каталоге MEDIA_ROOT"""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = override_settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def save_image(self, name, color, image_format='JPEG'):
+        buffer = BytesIO()
+        Image.new('RGB', (600, 400), color).save(buffer, image_format)
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def color(self, name):
+        with default_storage.open(name) as image_file, Image.open(image_file) as image:
+            return image.convert('RGB').getpixel((10, 10))
+
+
+class RenditionTests(TempMediaMixin, TestCase):
+    def test_originals_with_same_stem_keep_own_renditions(self):
+        red = render_image(self.save_image('products/photo.jpg', 'red'))
+        blue = render_image(self.save_image('products/photo.png', 'blue', 'PNG'))
+        self.assertNotEqual(red['card']['webp'], blue['card']['webp'])
+        self.assertGreater(self.color(red['card']['jpeg'])[0], 200)
+        self.assertGreater(self.color(blue['card']['jpeg'])[2], 200)
+
+
+class GenerateRenditionsTests(TempMediaMixin, TransactionTestCase):
+    # Команда закрывает соединения с БД перед запуском пула процессов
+    def test_regenerate_keeps_renditions_of_failed_products(self):
+        good, broken = make_products(2)
+        for product, color in [(good, 'red'), (broken, 'blue')]:
+            product.image = self.save_image(f'products/{product.slug}.jpg', color)
+            product.save()
+            Product.objects.filter(pk=product.pk).update(renditions=render_image(product.image.name))
+        default_storage.delete(broken.image.name)
+
+        call_command('generate_renditions', '--all', '--workers', '1', stdout=StringIO(), stderr=StringIO())
+
+        broken.refresh_from_db()
+        good.refresh_from_db()
+        self.assertTrue(broken.renditions)
+        for product in [good, broken]:
+            for entry in product.renditions.values():
+                self.assertTrue(default_storage.exists(entry['webp']), product.slug)
+
+
+class ImageWorkerTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.product = make_products(1)[0]
+        self.product.image = self.save_image('products/worker.jpg', 'green')
+        self.product.save()
+
+    def work(self, *args):
+        call_command('run_image_worker', '--once', *args, stdout=StringIO(), stderr=StringIO())
+        return ImageJob.objects.get(product=self.product)
+
+    def test_missing_file_is_retried_later(self):
+        default_storage.delete(self.product.image.name)
+        started = timezone.now()
+        job = self.work('--backoff', '60')
+        self.assertEqual(job.status, ImageJob.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreaterEqual(job.run_after, started + timedelta(seconds=60))
+        self.assertIsNone(job.locked_at)
+        self.assertIn('Error', job.last_error)
+
+        # Повтор еще не наступил
+        self.assertEqual(self.work().attempts, 1)
+        ImageJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        job = self.work('--backoff', '60')
+        self.assertEqual((job.status, job.attempts), (ImageJob.PENDING, 2))
+        self.assertGreaterEqual(job.run_after, started + timedelta(seconds=120))
+
+    def test_failed_after_max_attempts(self):
+        default_storage.delete(self.product.image.name)
+        for _ in range(2):
+            ImageJob.objects.filter(product=self.product).update(run_after=timezone.now())
+            job = self.work('--max-attempts', '2')
+        self.assertEqual((job.status, job.attempts), (ImageJob.FAILED, 2))
+        ImageJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertEqual(self.work('--max-attempts', '2').attempts, 2)
+
+    def test_stale_running_job_is_claimed_again(self):
+        job = ImageJob.objects.get(product=self.product)
+        ImageJob.objects.filter(pk=job.pk).update(
+            status=ImageJob.RUNNING, attempts=1, locked_at=timezone.now() - timedelta(seconds=30),
+        )
+        self.assertEqual(self.work('--stale-after', '60').status, ImageJob.RUNNING)
+        job = self.work('--stale-after', '10')
+        self.assertEqual((job.status, job.attempts), (ImageJob.DONE, 2))
+
+    def test_success_fills_renditions_and_changes_version(self):
+        version = catalog_version()
+        job = self.work()
+        self.assertEqual((job.status, job.attempts, job.last_error), (ImageJob.DONE, 1, ''))
+        self.product.refresh_from_db()
+        self.assertTrue(self.product.renditions)
+        for entry in self.product.renditions.values():
+            self.assertTrue(default_storage.exists(entry['webp']))
+        self.assertNotEqual(catalog_version(), version)
+
+    def test_job_requeued_during_run_stays_pending(self):
+        def replaced_meanwhile(product):
+            # Новое изображение с отложенной обработкой, чтобы --once
+            # не взял задание повторно
+            ImageJob.enqueue(product)
+            ImageJob.objects.filter(product=product).update(run_after=timezone.now() + timedelta(hours=1))
+            return {}
+
+        with mock.patch(
+            'products.management.commands.run_image_worker.process_product_image',
+            side_effect=replaced_meanwhile,
+        ) as process:
+            job = self.work()
+        process.assert_called_once()
+        self.assertEqual((job.status, job.attempts, job.locked_at), (ImageJob.PENDING, 0, None))
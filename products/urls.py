@@ -5,5 +5,7 @@ app_name = 'products'
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path('products/page/', views.catalog_page, name='catalog_page'),
+    path('products/suggest/', views.suggest_products, name='suggest'),
     path('products/<slug:slug>/', views.product_detail, name='product_detail'),
 ]
\ No newline at end of file
@@ -0,0 +1,26 @@
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = 'products:catalog_version'
+
+
+def catalog_version():
+    """
+    Номер версии каталога.
+
+    Входит в ключи кэша страниц: после изменения любого товара старые
+    страницы просто перестают находиться и со временем вытесняются.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version():
+    """Новая версия каталога (вызывается при изменении товаров)"""
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+        return cache.incr(CATALOG_VERSION_KEY)
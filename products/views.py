@@ -1,30 +1,107 @@
-from django.shortcuts import render, get_object_or_404
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.shortcuts import render
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from .conditional import (
+    make_etag, product_etag, product_last_modified, request_product, visitor_state,
+)
 from .models import Product
-from django.db.models import Q
+from .page_cache import cache_anonymous_page
+from .search import search_page
+from .suggest import suggest
+from core.pagination import keyset_page
 
 
-def home(request):
-    products = Product.objects.filter(is_available=True)
-    
+def _catalog_page(request):
+    """
+    Одна страница каталога с учетом поиска и курсора.
+
+    Результат запоминается в запросе: его сначала использует
+    расчет ETag, а затем, если страница изменилась, само представление.
+    """
+    if hasattr(request, '_catalog_page'):
+        return request._catalog_page
+    cursor = request.GET.get('cursor')
+
     # Обработка поискового запроса
     search_query = request.GET.get('search', '')
     if search_query:
-        # поиск без учета регистра по полю name и description
-        # icontains - поиск вхождения без учета регистра
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query)
+        # полнотекстовый поиск по названию и описанию,
+        # результаты отсортированы по релевантности
+        products, next_cursor = search_page(
+            search_query,
+            cursor=cursor,
+            per_page=settings.CATALOG_PAGE_SIZE,
         )
-    
-    context = {
+    else:
+        products, next_cursor = keyset_page(
+            Product.objects.filter(is_available=True),
+            cursor=cursor,
+            per_page=settings.CATALOG_PAGE_SIZE,
+        )
+    request._catalog_page = {
         'products': products,
         'search_query': search_query,
+        'next_cursor': next_cursor,
     }
+    return request._catalog_page
+
+
+def _catalog_etag(request):
+    """
+    ETag страницы каталога по ее собственным товарам.
+
+    Изменение, удаление или снятие с продажи товара на странице меняет
+    набор (id, updated_at), а правки других товаров страницу не затрагивают.
+    Last-Modified не отдается: по одной дате удаление товара не заметить.
+    """
+    state = visitor_state(request)
+    if state is None:
+        return None
+    page = _catalog_page(request)
+    return make_etag(
+        'catalog',
+        page['search_query'],
+        page['next_cursor'],
+        *[(product.id, product.updated_at) for product in page['products']],
+        *state,
+    )
+
+
+# Страницы отдаются с ETag: повторный запрос без изменений получает 304
+# без отрисовки шаблона. Ответ зависит от посетителя (корзина, пользователь),
+# поэтому общие кэши его не хранят, а браузер каждый раз перепроверяет.
+# Анонимным посетителям страницы отдаются из кэша (products.page_cache).
+@cache_anonymous_page
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_catalog_etag)
+def home(request):
+    context = _catalog_page(request)
     return render(request, 'home.html', context)
 
+@cache_anonymous_page
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_catalog_etag)
+def catalog_page(request):
+    """Следующий блок карточек товаров для бесконечной прокрутки"""
+    context = _catalog_page(request)
+    return render(request, 'products/includes/product_list.html', context)
+
+def suggest_products(request):
+    """Подсказки для строки поиска из индекса в памяти, без запросов к БД"""
+    query = request.GET.get('q', '')
+    return JsonResponse({'results': suggest(query)})
+
+@cache_anonymous_page
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=product_etag, last_modified_func=product_last_modified)
 def product_detail(request, slug):
-    product = get_object_or_404(Product, slug=slug)
+    # Товар уже загружен при расчете ETag
+    product = request_product(request, slug)
+    if product is None:
+        raise Http404('Товар не найден')
     context = {
         'product': product,
     }
-    return render(request, 'products/detail.html', context)
\ No newline at end of file
+    return render(request, 'products/detail.html', context)